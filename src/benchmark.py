@@ -0,0 +1,135 @@
+import argparse
+import random
+import sys
+import time
+
+from coordinator import Coordinator, InputScheduler, ScheduledUI
+from manager import PuzzleManager
+from profiler import PROFILER
+from registry import SOLVERS
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Hexapipes against a synthetic window')
+    parser.add_argument('--puzzle')
+    parser.add_argument('--width', type=int, default=100)
+    parser.add_argument('--height', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--radius', type=float, default=32)
+    parser.add_argument('--drag-ratio', type=float, default=1.0)
+    parser.add_argument('--miss-rate', type=float, default=0)
+    parser.add_argument('--locked-share', type=float, default=0)
+    parser.add_argument('--solver', default='bt', choices=SOLVERS.names())
+    parser.add_argument('--solve-order', action='store_true')
+    parser.add_argument('--no-apply', action='store_true')
+    parser.add_argument('--lock-unchanged', action='store_true')
+    parser.add_argument('--verify-pans', action='store_true')
+    parser.add_argument('--verify-apply', action='store_true')
+    parser.add_argument('--streaming-read', action='store_true')
+    parser.add_argument('--command-latency', type=float, default=0)
+    parser.add_argument('--windows', type=int, default=0)
+    parser.add_argument('--puzzles-per-window', type=int, default=1)
+    parser.add_argument('--profile', nargs='?', const='benchmark-profile', default='')
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.start()
+    try:
+        if args.windows:
+            benchmark_windows(args)
+        else:
+            benchmark(args)
+    finally:
+        if args.profile:
+            PROFILER.write(args.profile)
+
+
+def benchmark(args: argparse.Namespace) -> None:
+    if args.puzzle:
+        puzzle = SyntheticPuzzle.from_json(args.puzzle)
+    else:
+        puzzle, solution = SyntheticPuzzle.generate(args.width, args.height, args.seed)
+        # Simulates an interrupted apply that already turned and locked some of the tiles
+        rng = random.Random(args.seed)
+        for index in rng.sample(range(len(solution)), int(len(solution) * args.locked_share)):
+            puzzle.configurations[index] = solution[index]
+            puzzle.locked.add(index)
+    initial_configurations = list(puzzle.configurations)
+    ui = SyntheticUI(puzzle, radius=args.radius)
+    ui.drag_ratio = args.drag_ratio
+    ui.command_latency = args.command_latency
+    manager = PuzzleManager(ui.window_name, 'hexagonal', args.streaming_read, verify_pans=args.verify_pans, ui=ui)
+
+    start = time.perf_counter()
+    print(f"Puzzle: {puzzle.width}x{puzzle.height}")
+    try:
+        manager.read_puzzle()
+    except Exception as e:
+        print("Read failed:", e)
+    read_time = time.perf_counter() - start
+    read_commands = ui.commands
+    # A puzzle read with the wrong size counts as misread entirely
+    if manager.bridge.puzzle_size != (puzzle.width, puzzle.height) or not manager.puzzle.tiles:
+        print(f"Read: {read_time:.2f}s, {read_commands} commands, read as "
+              f"{manager.bridge.puzzle_size[0]}x{manager.bridge.puzzle_size[1]}, "
+              f"{len(initial_configurations)} misread tiles")
+        sys.exit(1)
+    misread = sum(1 for tile in manager.puzzle.tiles
+                  if tile.initial_configuration != initial_configurations[tile.y * puzzle.width + tile.x])
+
+    start = time.perf_counter()
+    manager.solve_puzzle(args.solver)
+    solve_time = time.perf_counter() - start
+
+    apply_time = 0
+    if not args.no_apply:
+        # Only the clicks of the apply phase get lost, the read has its own checks
+        ui.miss_rate = args.miss_rate
+        start = time.perf_counter()
+        manager.apply_puzzle(args.solve_order, args.lock_unchanged, verify=args.verify_apply)
+        apply_time = time.perf_counter() - start
+
+    print(f"Read: {read_time:.2f}s, {read_commands} commands, {misread} misread tiles")
+    print(f"Solve: {solve_time:.2f}s, solved: {manager.puzzle.is_solved()}")
+    if not args.no_apply:
+        print(f"Apply: {apply_time:.2f}s, {ui.commands - read_commands} commands, {ui.missed_clicks} missed clicks, "
+              f"solved in window: {puzzle.is_solved()}")
+    manager.print_settle_stats()
+
+
+def benchmark_windows(args: argparse.Namespace) -> None:
+    # Every synthetic window shows its puzzles one after another, all windows share the input scheduler
+    scheduler = InputScheduler()
+    managers = []
+    upcoming = {}
+    for window in range(args.windows):
+        puzzles = [SyntheticPuzzle.generate(args.width, args.height, args.seed + window * args.puzzles_per_window
+                                            + index)[0] for index in range(args.puzzles_per_window)]
+        ui = SyntheticUI(puzzles[0], radius=args.radius)
+        ui.window_name = f"Synthetic {window}"
+        ui.wid = str(window)
+        ui.drag_ratio = args.drag_ratio
+        ui.miss_rate = args.miss_rate
+        ui.command_latency = args.command_latency
+        managers.append(PuzzleManager(ui.window_name, 'hexagonal', args.streaming_read, verify_pans=args.verify_pans,
+                                      ui=ScheduledUI(ui, scheduler)))
+        upcoming[ui.window_name] = (ui, puzzles[1:])
+
+    def _handle_puzzle(manager: PuzzleManager) -> None:
+        manager.read_puzzle()
+        manager.solve_puzzle(args.solver)
+        if not args.no_apply:
+            manager.apply_puzzle(args.solve_order, args.lock_unchanged, verify=args.verify_apply)
+        ui, puzzles = upcoming[manager.window_name]
+        print(f"{manager.window_name}: solved {manager.puzzle.is_solved()}, solved in window {ui.puzzle.is_solved()}")
+        if puzzles:
+            ui.show_puzzle_after(puzzles.pop(0))
+
+    coordinator = Coordinator(managers, scheduler)
+    handled, solved = coordinator.run(_handle_puzzle, poll_interval=0.05, max_puzzles=args.puzzles_per_window)
+    if solved < handled or coordinator.stopped:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
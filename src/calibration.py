@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+from typing import Tuple, Optional
+
+DEFAULT_CALIBRATION_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'autopipes', 'calibration.json')
+STORE_LOCK = threading.Lock()
+
+
+class CalibrationCache:
+    path: Optional[str]
+    puzzle_type: str
+    entries: Optional[dict]
+
+    def __init__(self, path: Optional[str], puzzle_type: str):
+        # Without a path the calibration is only kept for the lifetime of the process
+        self.path = path
+        self.puzzle_type = puzzle_type
+        self.entries = None
+
+    def load(self, window_id: str, window_size: Tuple[int, int]) -> Optional[dict]:
+        return self._get_entries().get(self._key(window_id, window_size))
+
+    def store(self, window_id: str, window_size: Tuple[int, int], entry: dict) -> None:
+        self._get_entries()[self._key(window_id, window_size)] = entry
+        if self.path is None:
+            return
+        with STORE_LOCK:
+            # Other windows might have stored their calibration in the same file since it was read
+            self.entries = {**self._read(), self._key(window_id, window_size): entry}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated cache behind
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp_path, self.path)
+
+    def _get_entries(self) -> dict:
+        if self.entries is None:
+            self.entries = self._read()
+        return self.entries
+
+    def _read(self) -> dict:
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print("Ignoring unreadable calibration cache", self.path)
+            return {}
+
+    def _key(self, window_id: str, window_size: Tuple[int, int]) -> str:
+        return f"{self.puzzle_type}/{window_id}/{window_size[0]}x{window_size[1]}"
@@ -0,0 +1,130 @@
+import os
+import struct
+import time
+import zlib
+from typing import List, Optional, Tuple, BinaryIO
+
+from puzzle import Puzzle, Tile
+from topology import get_topology
+from util import rotate_configuration
+
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+# The file starts with a header describing the puzzle, followed by records that each hold the tiles that changed
+# since the previous record. Records end with a checksum, a record cut short by a crash is ignored when loading.
+MAGIC = b'APCK'
+VERSION = 1
+HEADER = struct.Struct('<4sBBIIBI')
+RECORD_HEADER = struct.Struct('<4sI')
+RECORD_MAGIC = b'REC1'
+RECORD_FOOTER = struct.Struct('<I')
+# Tile index, possible rotations as bitmask, solve order, component tile, component size and component exits
+TILE_STATE = struct.Struct('<IBiIIi')
+TileState = Tuple[int, int, int, int, int]
+
+
+class Checkpoint:
+    path: str
+    interval: float
+    last_save: float
+    saved_states: List[Optional[TileState]]
+    file: Optional[BinaryIO]
+
+    def __init__(self, path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.perf_counter()
+        self.saved_states = []
+        self.file = None
+
+    def maybe_save(self, puzzle: Puzzle) -> None:
+        # Solvers call this whenever their state is consistent, it only writes once the interval passed
+        if time.perf_counter() - self.last_save >= self.interval:
+            self.save(puzzle)
+
+    def save(self, puzzle: Puzzle) -> None:
+        if self.file is None:
+            self._start(puzzle)
+        states = [_tile_state(puzzle, tile) for tile in puzzle.tiles]
+        changed = [(index, state) for index, state in enumerate(states) if state != self.saved_states[index]]
+        if changed:
+            entries = b''.join(TILE_STATE.pack(index, *state) for index, state in changed)
+            self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, len(changed)) + entries +
+                            RECORD_FOOTER.pack(zlib.crc32(entries)))
+            self.file.flush()
+            self.saved_states = states
+        self.last_save = time.perf_counter()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _start(self, puzzle: Puzzle) -> None:
+        topology = puzzle.topology
+        if topology is None:
+            raise Exception("Checkpoints need a puzzle with a topology")
+        kind = topology.kind.encode()
+        # The header goes to a new file first, so resuming from and writing to the same path is safe
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(kind), topology.width, topology.height, int(topology.wrap),
+                                len(puzzle.tiles)))
+            f.write(kind)
+            f.write(bytes(tile.initial_configuration for tile in puzzle.tiles))
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, 'ab')
+        self.saved_states = [None] * len(puzzle.tiles)
+
+    @staticmethod
+    def load(path: str) -> Puzzle:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise Exception(f"Checkpoint {path} is too short")
+        magic, version, kind_length, width, height, wrap, tile_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise Exception(f"{path} is not a checkpoint of this version")
+        offset = HEADER.size
+        kind = data[offset:offset + kind_length].decode()
+        offset += kind_length
+        configurations = list(data[offset:offset + tile_count])
+        offset += tile_count
+        puzzle = Puzzle.from_topology(get_topology(kind, width, height, bool(wrap)), configurations)
+
+        records = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            record_magic, count = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + count * TILE_STATE.size
+            if record_magic != RECORD_MAGIC or end + RECORD_FOOTER.size > len(data) or \
+                    RECORD_FOOTER.unpack_from(data, end)[0] != zlib.crc32(data[start:end]):
+                print(f"Ignoring incomplete checkpoint record at byte {offset}")
+                break
+            for entry in TILE_STATE.iter_unpack(data[start:end]):
+                _restore_tile_state(puzzle, entry[0], entry[1:])
+            offset = end + RECORD_FOOTER.size
+            records += 1
+        print(f"Loaded checkpoint with {records} records, "
+              f"{sum(len(tile.possible_configurations) == 1 for tile in puzzle.tiles)}/{tile_count} tiles resolved.")
+        return puzzle
+
+
+def _tile_state(puzzle: Puzzle, tile: Tile) -> TileState:
+    neighbor_count = puzzle.topology.side_counts[tile.index]
+    rotations = sum(1 << rotation for rotation in range(neighbor_count)
+                    if rotate_configuration(tile.initial_configuration, rotation, neighbor_count)
+                    in tile.possible_configurations)
+    return rotations, tile.solve_order, tile.component.index, tile.component_size, tile.component_exits
+
+
+def _restore_tile_state(puzzle: Puzzle, index: int, state: TileState) -> None:
+    rotations, solve_order, component, component_size, component_exits = state
+    tile = puzzle.tiles[index]
+    neighbor_count = puzzle.topology.side_counts[index]
+    tile.possible_configurations = {rotate_configuration(tile.initial_configuration, rotation, neighbor_count)
+                                    for rotation in range(neighbor_count) if rotations >> rotation & 1}
+    tile.solve_order = solve_order
+    tile.component = puzzle.tiles[component]
+    tile.component_size = component_size
+    tile.component_exits = component_exits
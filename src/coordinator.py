@@ -0,0 +1,234 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Callable, Optional, Dict
+
+from PIL import Image
+
+from manager import PuzzleManager
+from ui import UI, STABLE_TIMEOUT, SettleStats
+
+# Input held back by a window: whether it needs the window focused and the call that sends it. Windows have to be
+# laid out next to each other to be captured in the background, so only keyboard input needs the focus, mouse input
+# goes to the window below the pointer.
+InputAction = Tuple[bool, Callable[[], None]]
+
+
+class InputScheduler:
+    lock: threading.Lock
+    focused: Optional["ScheduledUI"]
+    pointer_window: Optional["ScheduledUI"]
+    batches: int
+    actions: int
+    focus_switches: int
+    wait_time: float
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.focused = None
+        self.pointer_window = None
+        self.batches = 0
+        self.actions = 0
+        self.focus_switches = 0
+        self.wait_time = 0
+
+    def run(self, ui: "ScheduledUI", actions: List[InputAction]) -> None:
+        # Mouse and keyboard are shared by all windows, the batch of one window is never interleaved with another
+        start = time.perf_counter()
+        with self.lock:
+            self.wait_time += time.perf_counter() - start
+            if self.focused is not ui and any(focus for focus, _ in actions):
+                ui.ui.focus_window()
+                self.focused = ui
+                self.focus_switches += 1
+            for _, action in actions:
+                action()
+            self.batches += 1
+            self.actions += len(actions)
+
+
+class ScheduledUI(UI):
+    ui: UI
+    scheduler: InputScheduler
+    pending: List[InputAction]
+    pending_clicks: List[Tuple[int, int, int, int, bool]]
+    window_found: bool
+
+    def __init__(self, ui: UI, scheduler: InputScheduler):
+        # The window state stays with the wrapped UI, this only decides when its input is sent
+        self.ui = ui
+        super().__init__(ui.window_name)
+        self.scheduler = scheduler
+        self.pending = []
+        self.pending_clicks = []
+        self.window_found = False
+
+    @property
+    def window_name(self) -> str:
+        return self.ui.window_name
+
+    @window_name.setter
+    def window_name(self, window_name: str) -> None:
+        self.ui.window_name = window_name
+
+    @property
+    def wid(self) -> str:
+        return self.ui.wid
+
+    @property
+    def stable_region(self) -> Optional[Tuple[int, int, int, int]]:
+        return self.ui.stable_region
+
+    @stable_region.setter
+    def stable_region(self, region: Optional[Tuple[int, int, int, int]]) -> None:
+        self.ui.stable_region = region
+
+    @property
+    def settle_stats(self) -> SettleStats:
+        return self.ui.settle_stats
+
+    @settle_stats.setter
+    def settle_stats(self, settle_stats: SettleStats) -> None:
+        self.ui.settle_stats = settle_stats
+
+    def focus_window(self) -> None:
+        # After the window was found the scheduler only focuses it again for keyboard input
+        if not self.window_found:
+            self._queue(True, self._found)
+
+    def get_screenshot(self) -> Image:
+        # The pointer only has to be moved off the puzzle when input for this window left it there
+        self.focus_window()
+        if self.pending or self.pending_clicks or self.scheduler.pointer_window is self:
+            self.mouse_move(0, 0)
+        return self.capture()
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None) -> Image:
+        self.flush()
+        return self.ui.capture(region)
+
+    def capture_checksum(self, region: Optional[Tuple[int, int, int, int]] = None) -> int:
+        self.flush()
+        return self.ui.capture_checksum(region)
+
+    def wait_until_stable(self, timeout: float = STABLE_TIMEOUT) -> float:
+        self.flush()
+        return self.ui.wait_until_stable(timeout)
+
+    def mouse_move(self, x: int, y: int) -> None:
+        self._queue(False, lambda: self._move_pointer(x, y))
+
+    def mouse_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
+        self.pending_clicks.append((x, y, button, repeat, False))
+
+    def mouse_ctrl_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
+        self.pending_clicks.append((x, y, button, repeat, True))
+
+    def mouse_clicks(self, clicks: List[Tuple[int, int, int, int, bool]]) -> None:
+        # Clicks without anything in between are merged into a single call
+        self.pending_clicks.extend(clicks)
+
+    def mouse_drag_path(self, x: int, y: int, delta: List[Tuple[int, int]], button: int = 1) -> None:
+        self._queue(False, lambda: self._drag(x, y, delta, button))
+
+    def key_down(self, keycode: str) -> None:
+        self._queue(True, lambda: self.ui.key_down(keycode))
+
+    def key_up(self, keycode: str) -> None:
+        self._queue(True, lambda: self.ui.key_up(keycode))
+
+    def key_press(self, keycode: str) -> None:
+        self._queue(True, lambda: self.ui.key_press(keycode))
+
+    def flush(self) -> None:
+        self._close_clicks()
+        if self.pending:
+            actions = self.pending
+            self.pending = []
+            self.scheduler.run(self, actions)
+
+    def _queue(self, focus: bool, action: Callable[[], None]) -> None:
+        self._close_clicks()
+        self.pending.append((focus, action))
+
+    def _close_clicks(self) -> None:
+        if self.pending_clicks:
+            clicks = self.pending_clicks
+            self.pending_clicks = []
+            self.pending.append((False, lambda: self._click(clicks)))
+
+    def _found(self) -> None:
+        self.window_found = True
+
+    # These run while the scheduler holds the input, it tracks which window the pointer was left above
+    def _move_pointer(self, x: int, y: int) -> None:
+        self.ui.mouse_move(x, y)
+        self.scheduler.pointer_window = None
+
+    def _click(self, clicks: List[Tuple[int, int, int, int, bool]]) -> None:
+        self.ui.mouse_clicks(clicks)
+        self.scheduler.pointer_window = self
+
+    def _drag(self, x: int, y: int, delta: List[Tuple[int, int]], button: int) -> None:
+        self.ui.mouse_drag_path(x, y, delta, button)
+        self.scheduler.pointer_window = self
+
+
+class Coordinator:
+    managers: List[PuzzleManager]
+    scheduler: InputScheduler
+    results: Dict[str, Tuple[int, int]]
+    stopped: List[str]
+
+    def __init__(self, managers: List[PuzzleManager], scheduler: InputScheduler):
+        self.managers = managers
+        self.scheduler = scheduler
+        self.results = {}
+        self.stopped = []
+
+    def run(self, handle_puzzle: Callable[[PuzzleManager], None], poll_interval: float = 1.0,
+            max_puzzles: int = 0) -> Tuple[int, int]:
+        # Every window runs its own loop, captures and solving overlap while input is taken in turns. Returns the
+        # number of handled puzzles and of those handled without errors.
+        start = time.perf_counter()
+        # Solving holds the GIL, so every window solves in a process of its own. The processes are spawned, the
+        # threads of the other windows are already running when they start.
+        pool = ProcessPoolExecutor(len(self.managers), mp_context=multiprocessing.get_context('spawn'))
+        for manager in self.managers:
+            manager.solve_pool = pool
+        threads = [threading.Thread(target=self._run_window, args=(manager, handle_puzzle, poll_interval, max_puzzles),
+                                    name=manager.window_name, daemon=True)
+                   for manager in self.managers]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.shutdown()
+            for manager in self.managers:
+                manager.solve_pool = None
+            duration = time.perf_counter() - start
+            handled = sum(result[0] for result in self.results.values())
+            solved = sum(result[1] for result in self.results.values())
+            if solved < handled or self.stopped:
+                # A throughput that includes failed puzzles says nothing about the windows
+                print(f"{len(self.managers)} windows: {handled - solved} of {handled} puzzles failed"
+                      + (f", {len(self.stopped)} windows stopped" if self.stopped else "")
+                      + f" after {duration:.1f}s")
+            else:
+                print(f"{len(self.managers)} windows handled {handled} puzzles in {duration:.1f}s, "
+                      f"{solved / duration * 3600:.0f} per hour")
+            print(f"Input: {self.scheduler.actions} actions in {self.scheduler.batches} batches, "
+                  f"{self.scheduler.focus_switches} focus switches, {self.scheduler.wait_time:.2f}s waiting for input")
+        return handled, solved
+
+    def _run_window(self, manager: PuzzleManager, handle_puzzle: Callable[[PuzzleManager], None],
+                    poll_interval: float, max_puzzles: int) -> None:
+        try:
+            self.results[manager.window_name] = manager.run_loop(lambda: handle_puzzle(manager), poll_interval,
+                                                                 max_puzzles, manager.window_name)
+        except Exception as e:
+            print(f"{manager.window_name}: Stopped:", e)
+            self.stopped.append(manager.window_name)
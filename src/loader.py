@@ -0,0 +1,23 @@
+import json
+from typing import Tuple, List
+
+from puzzle import Puzzle
+from topology import Topology, get_topology
+
+
+def read_puzzle_file(path: str) -> Tuple[Topology, List[int]]:
+    with open(path) as f:
+        data = json.load(f)
+    topology = get_topology(data.get('grid', 'hexagonal'), data['width'], data['height'], data.get('wrap', False))
+    if len(data['tiles']) != topology.tile_count():
+        raise Exception(f"Expected {topology.tile_count()} tiles but got {len(data['tiles'])}")
+    # Hexapipes counts the sides counterclockwise, we count them clockwise starting at the same side
+    configurations = []
+    for index, configuration in enumerate(data['tiles']):
+        sides = topology.side_counts[index]
+        configurations.append(sum(1 << ((sides - i) % sides) for i in range(sides) if configuration & (1 << i)))
+    return topology, configurations
+
+
+def load_puzzle(path: str) -> Puzzle:
+    return Puzzle.from_topology(*read_puzzle_file(path))
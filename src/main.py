@@ -1,37 +1,158 @@
 import argparse
 import time
+from typing import Optional, TYPE_CHECKING
 
+from calibration import DEFAULT_CALIBRATION_CACHE
+from checkpoint import DEFAULT_CHECKPOINT_INTERVAL
 from manager import PuzzleManager
+from profiler import PROFILER
+from registry import BRIDGES, SOLVERS
+
+if TYPE_CHECKING:
+    from ui import UI
+
+DEFAULT_PROFILE = 'autopipes-profile'
 
 
 def main():
     parser = argparse.ArgumentParser(description='Solve Hexapipes')
     parser.add_argument('--window-name', default='Pipes Puzzle - Chromium')
-    parser.add_argument('--solver', default='bt', choices=['random', 'logic', 'bt'])
+    parser.add_argument('--windows', default='')
+    parser.add_argument('--solver', default='bt')
+    parser.add_argument('--portfolio', default='')
     parser.add_argument('--solve-order', action='store_true')
     parser.add_argument('--confirm-read', action='store_true')
     parser.add_argument('--only-full-solution', action='store_true')
+    parser.add_argument('--count-solutions', type=int, default=0)
     parser.add_argument('--no-solve', action='store_true')
     parser.add_argument('--no-apply', action='store_true')
-    parser.add_argument('--puzzle-type', '-t', default='hexagonal',
-                        choices=['hexagonal', 'square', 'octogonal', 'etrar', 'cube'])
+    parser.add_argument('--lock-unchanged', action='store_true')
+    parser.add_argument('--dry-run-apply', action='store_true')
+    parser.add_argument('--verify-apply', action='store_true')
+    parser.add_argument('--verify-pans', action='store_true')
+    parser.add_argument('--streaming-read', action='store_true')
+    parser.add_argument('--mosaic-scale', type=float, default=0)
+    parser.add_argument('--calibration-cache', default=DEFAULT_CALIBRATION_CACHE)
+    parser.add_argument('--no-calibration-cache', action='store_true')
+    parser.add_argument('--loop', '--daemon', action='store_true')
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--max-puzzles', type=int, default=0)
+    parser.add_argument('--puzzle-type', '-t', default='hexagonal')
+    parser.add_argument('--puzzle-file')
+    parser.add_argument('--checkpoint', default='')
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL)
+    parser.add_argument('--resume')
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE, default='')
+    parser.add_argument('--profile-cprofile', action='append', default=[])
     args = parser.parse_args()
+    # Plugins are only loaded once they are used, a typo would otherwise only show after reading the screen
+    if not SOLVERS.has(args.solver):
+        parser.error(f"Unknown solver '{args.solver}', available: {', '.join(SOLVERS.names())}")
+    if not BRIDGES.has(args.puzzle_type):
+        parser.error(f"Unknown puzzle type '{args.puzzle_type}', available: {', '.join(BRIDGES.names())}")
+    if args.resume and args.loop:
+        parser.error("--resume can not be combined with --loop")
+    if args.profile_cprofile and not args.profile:
+        parser.error("--profile-cprofile needs --profile")
+    if args.windows and (args.puzzle_file or args.resume or args.checkpoint):
+        parser.error("--windows can not be combined with --puzzle-file, --resume or --checkpoint")
+
+    if args.profile:
+        PROFILER.start(args.profile_cprofile)
+    try:
+        if args.windows:
+            run_windows(args)
+        else:
+            run(create_manager(args, args.window_name), args)
+    finally:
+        if args.profile:
+            PROFILER.write(args.profile)
+
+
+def create_manager(args: argparse.Namespace, window_name: str, ui: Optional["UI"] = None) -> PuzzleManager:
+    return PuzzleManager(window_name, args.puzzle_type, args.streaming_read, args.mosaic_scale,
+                         args.verify_pans, '' if args.no_calibration_cache else args.calibration_cache, ui=ui,
+                         checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval)
+
 
+def run_windows(args: argparse.Namespace) -> None:
+    # Window names or ids separated by commas, every window is handled by its own manager
+    from coordinator import Coordinator, InputScheduler, ScheduledUI
+    from ui import UI
+
+    scheduler = InputScheduler()
+    managers = [create_manager(args, name.strip(), ScheduledUI(UI(name.strip()), scheduler))
+                for name in args.windows.split(',')]
     time.sleep(0.5)
-    manager = PuzzleManager(args.window_name, args.puzzle_type)
+    Coordinator(managers, scheduler).run(lambda manager: handle_puzzle(manager, args), args.poll_interval,
+                                         args.max_puzzles if args.loop else 1)
+
+
+def run(manager: PuzzleManager, args: argparse.Namespace) -> None:
+    # Resuming without applying does not need the window, otherwise it is read again to find the puzzle
+    if args.puzzle_file or (args.resume and args.no_apply):
+        solve_file(manager, args)
+        return
+
+    time.sleep(0.5)
+    if args.loop:
+        manager.run_loop(lambda: handle_puzzle(manager, args), args.poll_interval, args.max_puzzles)
+    else:
+        handle_puzzle(manager, args)
+        manager.print_settle_stats()
+
+
+def solve_file(manager: PuzzleManager, args: argparse.Namespace) -> None:
+    # Offline solving never touches a window
+    if args.puzzle_file:
+        manager.load_puzzle(args.puzzle_file)
+    if args.resume:
+        manager.resume_puzzle(args.resume)
+    if args.count_solutions:
+        print_solution_count(manager, args.count_solutions)
+    if args.no_solve:
+        return
+    manager.solve_puzzle(args.solver, solver_options(args))
+    print("Solved:", manager.puzzle.is_solved())
+    for tile in manager.puzzle.tiles:
+        if tile.x == 0 and tile.y > 0:
+            print()
+        solution = next(iter(tile.possible_configurations)) if len(tile.possible_configurations) == 1 else 0
+        print("{:02}".format(solution), end="  ")
+    print()
+
+
+def print_solution_count(manager: PuzzleManager, limit: int) -> None:
+    count = manager.count_solutions(limit)
+    if count >= limit:
+        print(f"Solutions: at least {count}")
+    else:
+        print(f"Solutions: {count}")
+
+
+def solver_options(args: argparse.Namespace) -> dict:
+    if args.solver == 'portfolio' and args.portfolio:
+        return {'configurations': args.portfolio}
+    return {}
+
 
+def handle_puzzle(manager: PuzzleManager, args: argparse.Namespace) -> None:
     manager.read_puzzle(args.confirm_read)
+    if args.resume:
+        manager.resume_puzzle(args.resume)
+    if args.count_solutions:
+        print_solution_count(manager, args.count_solutions)
     if args.no_solve:
         return
 
-    manager.solve_puzzle(args.solver)
+    manager.solve_puzzle(args.solver, solver_options(args))
     if args.only_full_solution and not manager.puzzle.is_solved():
         print("Did not find full solution.")
         return
     if args.no_apply:
         return
 
-    manager.apply_puzzle(args.solve_order)
+    manager.apply_puzzle(args.solve_order, args.lock_unchanged, args.dry_run_apply, args.verify_apply)
 
 
 if __name__ == '__main__':
@@ -1,38 +1,174 @@
+import inspect
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Optional, Dict, Tuple, Callable, Any, Iterator, TYPE_CHECKING
+
+from calibration import CalibrationCache
+from checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from loader import load_puzzle
+from profiler import PROFILER
 from puzzle import Puzzle
-from solver.bt import BtSolver
-from solver.logic import LogicSolver
-from solver.random import RandomSolver
-from ui import UI
+from registry import BRIDGES, SOLVERS
 from uibridge.bridge import Bridge
-from uibridge.hexagonal import HexagonalBridge
-
-BRIDGES = {
-    'hexagonal': HexagonalBridge
-}
 
-SOLVERS = {
-    'random': RandomSolver,
-    'logic': LogicSolver,
-    'bt': BtSolver,
-}
+if TYPE_CHECKING:
+    from ui import UI
 
 
 class PuzzleManager:
-    ui: UI
-    bridge: Bridge
+    window_name: str
+    puzzle_type: str
+    bridge_options: Dict[str, Any]
+    checkpoint_path: str
+    checkpoint_interval: float
+    ui: Optional["UI"]
+    bridge: Optional[Bridge]
     puzzle: Puzzle
+    phase_times: Dict[str, float]
+    solve_pool: Optional[Executor]
 
-    def __init__(self, window_name: str, puzzle_type: str):
-        self.ui = UI(window_name)
+    def __init__(self, window_name: str, puzzle_type: str, streaming_read: bool = False, mosaic_scale: float = 0,
+                 verify_pans: bool = False, calibration_cache: str = '', ui: Optional["UI"] = None,
+                 checkpoint: str = '', checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        self.window_name = window_name
+        self.puzzle_type = puzzle_type
+        self.bridge_options = {
+            'streaming_read': streaming_read,
+            'mosaic_scale': mosaic_scale,
+            'verify_pans': verify_pans,
+            'calibration_cache': CalibrationCache(calibration_cache or None, puzzle_type),
+        }
+        self.checkpoint_path = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.ui = ui
+        self.bridge = None
         self.images = []
         self.puzzle = Puzzle([])
-        self.bridge = BRIDGES[puzzle_type](self.ui)
+        self.phase_times = {}
+        self.solve_pool = None
+
+    def connect(self) -> Bridge:
+        # The window and with it the imaging code are only loaded once they are needed
+        if self.bridge is None:
+            if self.ui is None:
+                from ui import UI
+                self.ui = UI(self.window_name)
+            self.bridge = BRIDGES.load(self.puzzle_type)(self.ui, **self.bridge_options)
+        return self.bridge
+
+    @contextmanager
+    def _phase(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        with PROFILER.span(phase):
+            yield
+        self.phase_times[phase] = time.perf_counter() - start
+
+    def load_puzzle(self, path: str) -> None:
+        with self._phase('read'):
+            self.puzzle = load_puzzle(path)
 
     def read_puzzle(self, confirm_read: bool = False) -> None:
-        self.puzzle = self.bridge.read_puzzle(confirm_read)
+        with self._phase('read'):
+            self.puzzle = self.connect().read_puzzle(confirm_read)
+
+    def resume_puzzle(self, path: str) -> None:
+        with self._phase('resume'):
+            puzzle = Checkpoint.load(path)
+            # A puzzle that was read before has to be the one the checkpoint was written for
+            if self.puzzle.tiles and [tile.initial_configuration for tile in self.puzzle.tiles] != \
+                    [tile.initial_configuration for tile in puzzle.tiles]:
+                raise Exception(f"Checkpoint {path} belongs to a different puzzle")
+            # Tiles locked in the window must not be clicked again
+            for tile, read_tile in zip(puzzle.tiles, self.puzzle.tiles):
+                if read_tile.locked:
+                    tile.locked = True
+            self.puzzle = puzzle
+
+    def solve_puzzle(self, solver: str, solver_options: Optional[Dict[str, Any]] = None) -> None:
+        with self._phase('solve'):
+            solver_options = dict(solver_options or {})
+            solver_class = SOLVERS.load(solver)
+            # Checkpoints are written by the solver itself, so those always solve here
+            if self.solve_pool is not None and not self.checkpoint_path:
+                from solver.portfolio import puzzle_state, solve_state, apply_result
+                # Released tiles have to be known here as well, the apply unlocks them
+                self.puzzle.release_inconsistent_locks()
+                apply_result(self.puzzle, self.solve_pool.submit(solve_state, solver, solver_options,
+                                                                 puzzle_state(self.puzzle)).result())
+                return
+            checkpoint = None
+            if self.checkpoint_path:
+                checkpoint = Checkpoint(self.checkpoint_path, self.checkpoint_interval)
+                # Solvers without intermediate checkpoints still get their final state saved below
+                if 'checkpoint' in inspect.signature(solver_class).parameters:
+                    solver_options['checkpoint'] = checkpoint
+                else:
+                    print(f"Solver {solver} does not write intermediate checkpoints, only the result is saved")
+            try:
+                solver_instance = solver_class(self.puzzle, **solver_options)
+                solver_instance.solve()
+                # Solvers that pick between several configurations report which one won
+                if getattr(solver_instance, 'winner', None):
+                    print("Solver winner:", solver_instance.winner)
+                if checkpoint:
+                    checkpoint.save(self.puzzle)
+            finally:
+                if checkpoint:
+                    checkpoint.close()
+
+    def count_solutions(self, limit: int) -> int:
+        from solver.counter import SolutionCounter
+        with self._phase('count'):
+            return SolutionCounter(self.puzzle, limit).count()
+
+    def apply_puzzle(self, solve_order: bool, lock_unchanged: bool = False, dry_run: bool = False,
+                     verify: bool = False) -> None:
+        with self._phase('apply'):
+            self.connect().apply_puzzle(self.puzzle, solve_order, lock_unchanged, dry_run, verify)
+            self.ui.flush()
+
+    def run_loop(self, handle_puzzle: Callable[[], None], poll_interval: float = 1.0, max_puzzles: int = 0,
+                 label: str = '') -> Tuple[int, int]:
+        # The UI session, calibration and imports stay warm between puzzles. Returns the number of handled puzzles
+        # and of those handled without errors.
+        prefix = f"{label}: " if label else ''
+        handled = 0
+        solved = 0
+        start = time.perf_counter()
+        try:
+            while not max_puzzles or handled < max_puzzles:
+                self.phase_times = {}
+                if handled > 0:
+                    with self._phase('wait'):
+                        self.wait_for_new_puzzle(poll_interval)
+                handled += 1
+                try:
+                    handle_puzzle()
+                except Exception as e:
+                    print(f"{prefix}Puzzle {handled} failed:", e)
+                    continue
+                solved += 1
+                print(f"{prefix}Puzzle {handled}:",
+                      ", ".join(f"{phase} {duration:.2f}s" for phase, duration in self.phase_times.items()))
+        finally:
+            duration = time.perf_counter() - start
+            print(f"{prefix}Handled {handled} puzzles ({solved} without errors) in {duration:.1f}s, "
+                  f"{solved / duration * 3600:.0f} per hour")
+            self.print_settle_stats(prefix)
+        return handled, solved
 
-    def solve_puzzle(self, solver: str) -> None:
-        SOLVERS[solver](self.puzzle).solve()
+    def print_settle_stats(self, prefix: str = '') -> None:
+        # Time spent waiting for the window to redraw, it replaced fixed sleeps and has to be watched
+        if self.ui is not None and self.ui.settle_stats.count:
+            print(f"{prefix}Settle: {self.ui.settle_stats}")
 
-    def apply_puzzle(self, solve_order: bool) -> None:
-        self.bridge.apply_puzzle(self.puzzle, solve_order)
+    def wait_for_new_puzzle(self, poll_interval: float) -> None:
+        # A cheap checksum of the downsampled puzzle box changes once the next puzzle is shown
+        self.connect()
+        self.ui.wait_until_stable()
+        reference = self.ui.capture_checksum(self.ui.stable_region)
+        while self.ui.capture_checksum(self.ui.stable_region) == reference:
+            time.sleep(poll_interval)
+        # Let the new puzzle finish loading
+        self.ui.wait_until_stable()
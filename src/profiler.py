@@ -0,0 +1,168 @@
+import cProfile
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Set, Optional, Callable, Iterator
+
+# Upper bounds in milliseconds of the latency histogram buckets of external commands
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+SpanPath = Tuple[str, ...]
+
+
+class SpanStats:
+    count: int
+    total: float
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+
+class Profiler:
+    enabled: bool
+    start_time: float
+    spans: Dict[SpanPath, SpanStats]
+    counters: Dict[str, int]
+    commands: Dict[str, List[float]]
+    cprofile_phases: Set[str]
+    cprofiles: Dict[str, cProfile.Profile]
+    lock: threading.Lock
+    local: threading.local
+
+    def __init__(self):
+        # Disabled profilers only cost a flag check, so the instrumentation can stay in place
+        self.enabled = False
+        self.start_time = 0
+        self.spans = {}
+        self.counters = {}
+        self.commands = {}
+        self.cprofile_phases = set()
+        self.cprofiles = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def start(self, cprofile_phases: Optional[List[str]] = None) -> None:
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        self.cprofile_phases = set(cprofile_phases or [])
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        stack.append(name)
+        path = tuple(stack)
+        # Only the outermost span of a phase is profiled, cProfile can not be nested
+        profile = None
+        if name in self.cprofile_phases and name not in stack[:-1] and \
+                threading.current_thread() is threading.main_thread():
+            profile = self.cprofiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            stack.pop()
+            with self.lock:
+                stats = self.spans.setdefault(path, SpanStats())
+                stats.count += 1
+                stats.total += duration
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_command(self, name: str, duration: float) -> None:
+        # External commands show up both in their latency histogram and as a span below the current phase
+        if not self.enabled:
+            return
+        path = tuple(self._stack()) + (name,)
+        with self.lock:
+            self.commands.setdefault(name, []).append(duration)
+            stats = self.spans.setdefault(path, SpanStats())
+            stats.count += 1
+            stats.total += duration
+
+    def report(self) -> dict:
+        children: Dict[SpanPath, float] = {}
+        for path, stats in self.spans.items():
+            if len(path) > 1:
+                children[path[:-1]] = children.get(path[:-1], 0) + stats.total
+        return {
+            'wall_time': time.perf_counter() - self.start_time,
+            'spans': [{'path': ';'.join(path), 'count': stats.count, 'total': stats.total,
+                       'self': max(0.0, stats.total - children.get(path, 0))}
+                      for path, stats in sorted(self.spans.items())],
+            'counters': dict(sorted(self.counters.items())),
+            'commands': {name: _latency_summary(durations) for name, durations in sorted(self.commands.items())},
+            'cprofile': sorted(self.cprofiles),
+        }
+
+    def write(self, prefix: str) -> None:
+        report = self.report()
+        with open(prefix + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+        # Collapsed stacks with the self time in microseconds, as read by flamegraph.pl and speedscope
+        with open(prefix + '.collapsed', 'w') as f:
+            for span in report['spans']:
+                if int(span['self'] * 1e6) > 0:
+                    f.write(f"{span['path']} {int(span['self'] * 1e6)}\n")
+        for name, profile in self.cprofiles.items():
+            profile.dump_stats(f"{prefix}.{name}.prof")
+        print(f"Profile written to {prefix}.json and {prefix}.collapsed")
+        for span in report['spans']:
+            if ';' not in span['path']:
+                print(f"  {span['path']}: {span['total']:.2f}s in {span['count']} calls")
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self.local, 'stack'):
+            thread = threading.current_thread()
+            self.local.stack = [] if thread is threading.main_thread() else [f"[{thread.name}]"]
+        return self.local.stack
+
+
+def _latency_summary(durations: List[float]) -> dict:
+    ordered = sorted(durations)
+
+    def _percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    histogram = {}
+    for duration in ordered:
+        milliseconds = duration * 1000
+        bucket = next((f"<={bound}ms" for bound in HISTOGRAM_BUCKETS if milliseconds <= bound),
+                      f">{HISTOGRAM_BUCKETS[-1]}ms")
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return {
+        'count': len(ordered),
+        'total_ms': sum(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': _percentile(0.5),
+        'p90_ms': _percentile(0.9),
+        'p99_ms': _percentile(0.99),
+        'max_ms': ordered[-1] * 1000,
+        'histogram': histogram,
+    }
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    def _decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def _wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            with PROFILER.span(name):
+                return function(*args, **kwargs)
+        return _wrapper
+    return _decorator
@@ -1,9 +1,11 @@
-from typing import List, Set, Dict, Union
+from typing import List, Set, Dict, Union, Optional
 
-from util import rotate_configuration, connection_count
+from topology import Topology
+from util import rotate_configuration, connection_count, is_connection
 
 
 class Tile:
+    index: int
     x: int
     y: int
     initial_configuration: int
@@ -13,9 +15,12 @@ class Tile:
     component_size: int
     component_exits: int
     solve_order: int
+    locked: bool
+    lock_released: bool
     original_tile: "Tile"
 
-    def __init__(self, x: int, y: int, configuration: int, neighbor_count: int):
+    def __init__(self, x: int, y: int, configuration: int, neighbor_count: int, index: int = -1):
+        self.index = index
         self.x = x
         self.y = y
         self.initial_configuration = configuration
@@ -26,10 +31,26 @@ class Tile:
         self.component_size = 1
         self.component_exits = connection_count(configuration)
         self.solve_order = -1
+        self.locked = False
+        self.lock_released = False
         self.original_tile = self
 
+    def lock(self):
+        # The tile was already locked in the window, so its current configuration is final
+        self.locked = True
+        self.possible_configurations = {self.initial_configuration}
+
+    def release_lock(self):
+        # Locked in the window, but contradicting the board. It is solved like any other tile and unlocked when applied.
+        self.locked = False
+        self.lock_released = True
+        neighbor_count = len(self.neighbors)
+        self.possible_configurations = set(rotate_configuration(self.initial_configuration, i, neighbor_count)
+                                           for i in range(neighbor_count))
+
     def apply_tile(self, other: "Tile"):
-        self.neighbors.extend(other.neighbors)
+        self.index = other.index
+        self.neighbors = list(other.neighbors)
         self.possible_configurations = set(other.possible_configurations)
         self.component = other.component
         self.component_size = other.component_size
@@ -63,13 +84,48 @@ class Tile:
 class Puzzle:
     tiles: List[Tile]
     tile_lookup: Dict[int, Dict[int, Tile]]
+    topology: Optional[Topology]
 
-    def __init__(self, tiles: List[Tile]):
+    def __init__(self, tiles: List[Tile], topology: Optional[Topology] = None):
         self.tiles = tiles
+        self.topology = topology
         self.tile_lookup = {}
         for tile in tiles:
             self.tile_lookup.setdefault(tile.y, {})[tile.x] = tile
 
+    @staticmethod
+    def from_topology(topology: Topology, configurations: List[int]) -> "Puzzle":
+        tiles = [Tile(position[0], position[1], configurations[index], topology.side_counts[index], index)
+                 for index, position in enumerate(topology.positions)]
+        for tile in tiles:
+            for side in range(topology.side_counts[tile.index]):
+                neighbor = topology.neighbor(tile.index, side)
+                tile.neighbors.append(tiles[neighbor] if neighbor >= 0 else None)
+        return Puzzle(tiles, topology)
+
+    def release_inconsistent_locks(self) -> List[Tile]:
+        # A lock can land on a tile whose rotation got lost, which then points off the board or at a locked neighbor
+        # that does not point back. Which of two such neighbors is wrong is unknown, so both are released.
+        inconsistent = set()
+        for tile in self.tiles:
+            if not tile.locked:
+                continue
+            for side, neighbor in enumerate(tile.neighbors):
+                connection = is_connection(tile.initial_configuration, side)
+                if neighbor is None:
+                    if connection:
+                        inconsistent.add(tile)
+                elif neighbor.locked and connection != is_connection(
+                        neighbor.initial_configuration, self.topology.reverse_side(tile.index, side)):
+                    inconsistent.update((tile, neighbor))
+        released = sorted(inconsistent, key=lambda t: t.index)
+        for tile in released:
+            tile.release_lock()
+        if released:
+            print(f"Released {len(released)} locked tiles that contradict the board:",
+                  ", ".join(f"{tile.x}/{tile.y}" for tile in released))
+        return released
+
     def get_tile(self, x: int, y: int) -> Union[Tile, None]:
         return self.tile_lookup.get(y, {}).get(x)
 
@@ -79,3 +135,4 @@ class Puzzle:
                 raise Exception(f"Tile at {tile.x}/{tile.y} (initial={tile.initial_configuration}) "
                                 f"does not have any possible configurations.")
         return all(len(tile.possible_configurations) == 1 for tile in self.tiles)
+
@@ -0,0 +1,56 @@
+import importlib
+from typing import Dict, Any, List
+
+
+class Registry:
+    kind: str
+    group: str
+    builtins: Dict[str, str]
+    loaded: Dict[str, Any]
+
+    def __init__(self, kind: str, group: str, builtins: Dict[str, str]):
+        # Plugins are given as 'module:attribute' and only imported once they are selected
+        self.kind = kind
+        self.group = group
+        self.builtins = builtins
+        self.loaded = {}
+
+    def load(self, name: str) -> Any:
+        if name not in self.loaded:
+            if name in self.builtins:
+                module, attribute = self.builtins[name].split(':')
+                self.loaded[name] = getattr(importlib.import_module(module), attribute)
+            else:
+                # Scanning the installed distributions is slow, so only do it for unknown names
+                plugins = self._entry_points()
+                if name not in plugins:
+                    raise Exception(f"Unknown {self.kind} '{name}', available: {', '.join(self.names())}")
+                self.loaded[name] = plugins[name].load()
+        return self.loaded[name]
+
+    def has(self, name: str) -> bool:
+        return name in self.builtins or name in self._entry_points()
+
+    def names(self) -> List[str]:
+        return sorted(set(self.builtins) | set(self._entry_points()))
+
+    def _entry_points(self) -> Dict[str, Any]:
+        from importlib.metadata import entry_points
+        plugins = entry_points()
+        if hasattr(plugins, 'select'):
+            plugins = plugins.select(group=self.group)
+        else:
+            plugins = plugins.get(self.group, [])
+        return {plugin.name: plugin for plugin in plugins}
+
+
+BRIDGES = Registry('puzzle type', 'autopipes.bridges', {
+    'hexagonal': 'uibridge.hexagonal:HexagonalBridge',
+})
+
+SOLVERS = Registry('solver', 'autopipes.solvers', {
+    'random': 'solver.random:RandomSolver',
+    'logic': 'solver.logic:LogicSolver',
+    'bt': 'solver.bt:BtSolver',
+    'portfolio': 'solver.portfolio:PortfolioSolver',
+})
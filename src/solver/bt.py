@@ -1,7 +1,11 @@
+import random
 from collections import deque
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
+from checkpoint import Checkpoint
+from profiler import PROFILER
 from puzzle import Puzzle, Tile
+from solver.propagation import propagate_bulk
 from util import is_connection
 
 INITIAL_MAX_DEPTH = 1
@@ -9,25 +13,47 @@ INITIAL_MAX_DEPTH = 1
 
 class BtSolver:
     puzzle: Puzzle
+    max_depth: int
+    seed: Optional[int]
+    checkpoint: Optional[Checkpoint]
     solve_order: int
     tile_override: List[Dict[Tile, Tile]]
+    tile_order: List[Tile]
     solved: bool
 
-    def __init__(self, puzzle: Puzzle):
+    def __init__(self, puzzle: Puzzle, max_depth: int = INITIAL_MAX_DEPTH, seed: Optional[int] = None,
+                 checkpoint: Optional[Checkpoint] = None):
+        # With a seed the tiles are tried in a shuffled order, which gives different runs for a portfolio
         self.puzzle = puzzle
-        self.solve_order = 0
+        self.max_depth = max_depth
+        self.seed = seed
+        self.checkpoint = checkpoint
+        self.solve_order = max((tile.solve_order for tile in puzzle.tiles), default=-1) + 1
         self.tile_override = []
+        self.tile_order = []
         self.solved = False
 
     def solve(self):
         self.solved = False
         self.tile_override = []
+        self.tile_order = list(self.puzzle.tiles)
+        if self.seed is not None:
+            random.Random(self.seed).shuffle(self.tile_order)
 
+        self.puzzle.release_inconsistent_locks()
+        for tile in self.puzzle.tiles:
+            if tile.locked and tile.solve_order == -1:
+                self._apply_configuration(tile)
+        for tile in propagate_bulk(self.puzzle):
+            self._apply_configuration(tile)
         sorted_tiles = sorted(self.puzzle.tiles, key=lambda t: (t.y, t.x))
-        for tile in sorted_tiles:
-            if len(tile.possible_configurations) > 1:
-                self._logic_pass_one(tile)
-        self._bt_pass(INITIAL_MAX_DEPTH)
+        with PROFILER.span('logic_sweep'):
+            for tile in sorted_tiles:
+                if len(tile.possible_configurations) > 1:
+                    self._logic_pass_one(tile)
+                    self._maybe_save_checkpoint()
+        with PROFILER.span('backtracking'):
+            self._bt_pass(self.max_depth)
 
     def _bt_pass(self, max_depth: int) -> bool:
         if max_depth < 1:
@@ -36,7 +62,7 @@ class BtSolver:
         while changed:
             changed = False
             # TODO be smarter when choosing tiles to process
-            for tile in self.puzzle.tiles:
+            for tile in self.tile_order:
                 changed_tile, might_be_possible = self._bt_pass_one(tile, max_depth)
                 if self.solved:
                     return True
@@ -45,6 +71,7 @@ class BtSolver:
                 if changed_tile:
                     self._logic_pass_one(tile)
                     changed = True
+                self._maybe_save_checkpoint()
         return True
 
     def _bt_pass_one(self, tile: Tile, max_depth: int) -> Tuple[bool, bool]:
@@ -73,6 +100,11 @@ class BtSolver:
                 self._pop_state()
         return changed_tile, len(writable_tile.possible_configurations) > 0
 
+    def _maybe_save_checkpoint(self):
+        # Only the state outside of any backtracking attempt is saved, resuming restarts the current pass
+        if self.checkpoint and not self.tile_override:
+            self.checkpoint.maybe_save(self.puzzle)
+
     def _push_state(self):
         print("Push state.")
         self.tile_override.append({})
@@ -174,7 +206,7 @@ class BtSolver:
                 if c1.component_exits + c2.component_exits - 2 == 0 and \
                         c1.component_size + c2.component_size != len(self.puzzle.tiles):
                     return False
-            reverse_index = self._get_reverse_index(tile, neighbor)
+            reverse_index = self.puzzle.topology.reverse_side(tile.index, i)
             if not self._check_connection_possible(neighbor, reverse_index, connection):
                 return False
         return True
@@ -185,12 +217,6 @@ class BtSolver:
                 return True
         return False
 
-    def _get_reverse_index(self, tile: Tile, neighbor: Tile) -> int:
-        for i in range(len(neighbor.neighbors)):
-            if self._read_tile(neighbor.neighbors[i]) == tile:
-                return i
-        raise Exception("No reverse neighbor found")
-
     def _merge_neighbors(self, tile: Tile):
         configuration = next(iter(tile.possible_configurations))
         for i in range(len(tile.neighbors)):
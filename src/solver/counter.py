@@ -0,0 +1,288 @@
+from collections import deque
+from typing import List, Tuple, Dict, Optional
+
+from puzzle import Puzzle
+from solver.logic import LogicSolver
+from util import is_connection
+
+# A region of unresolved tiles connects some of the fixed networks around it. Its signature lists the groups of
+# fixed networks it joins (only groups of two or more) and the number of networks it closes off on its own.
+Signature = Tuple[Tuple[Tuple[int, ...], ...], int]
+# Per tile and side: None for the border, ('region', tile, side) or ('fixed', connected, label)
+SideLink = Optional[Tuple[str, int, int]]
+RegionKey = Tuple[Tuple[Tuple[int, ...], Tuple[SideLink, ...]], ...]
+
+
+class SolutionCounter:
+    puzzle: Puzzle
+    limit: int
+    region_cache: Dict[RegionKey, Dict[Signature, int]]
+    cache_hits: int
+
+    def __init__(self, puzzle: Puzzle, limit: int = 2):
+        # Counts stop growing at the limit, so the result is the number of solutions or the limit if there are more
+        self.puzzle = puzzle
+        self.limit = limit
+        self.region_cache = {}
+        self.cache_hits = 0
+
+    def count(self) -> int:
+        topology = self.puzzle.topology
+        if topology is None:
+            raise Exception("Counting solutions needs a puzzle with a topology")
+        # Work on a copy so the puzzle itself keeps its configurations, the logic pass only removes impossible ones
+        puzzle = Puzzle.from_topology(topology, [tile.initial_configuration for tile in self.puzzle.tiles])
+        for tile, original in zip(puzzle.tiles, self.puzzle.tiles):
+            tile.possible_configurations = set(original.possible_configurations)
+        LogicSolver(puzzle).solve()
+        domains = [sorted(tile.possible_configurations) for tile in puzzle.tiles]
+        if any(not domain for domain in domains):
+            return 0
+
+        fixed_components = self._merge_fixed_tiles(domains)
+        if fixed_components is None:
+            return 0
+        regions = self._find_regions(domains)
+        fixed_count = len(set(fixed_components.values()))
+        if not regions:
+            return 1 if fixed_count == 1 else 0
+
+        # Partitions of the fixed networks into joined groups, with the number of ways to reach each
+        partitions: Dict[Tuple[Tuple[int, ...], ...], int] = {(): 1}
+        for region in regions:
+            table, labels = self._count_region(region, domains, fixed_components)
+            if fixed_count == 0:
+                # Without fixed tiles the only region is the whole puzzle and has to form a single network
+                return min(table.get(((), 1), 0), self.limit)
+            next_partitions: Dict[Tuple[Tuple[int, ...], ...], int] = {}
+            for partition, partition_count in partitions.items():
+                for (groups, closed), region_count in table.items():
+                    if closed > 0:
+                        continue
+                    merged = self._join(partition, [tuple(labels[label] for label in group) for group in groups])
+                    if merged is not None:
+                        next_partitions[merged] = min(next_partitions.get(merged, 0) + partition_count * region_count,
+                                                      self.limit)
+            partitions = next_partitions
+        if fixed_count == 1:
+            return min(partitions.get((), 0), self.limit)
+        return min(sum(count for partition, count in partitions.items()
+                       if len(partition) == 1 and len(partition[0]) == fixed_count), self.limit)
+
+    def _merge_fixed_tiles(self, domains: List[List[int]]) -> Optional[Dict[int, int]]:
+        # Joins the resolved tiles into networks, returns the network of every resolved tile or None on a conflict
+        topology = self.puzzle.topology
+        parent = {index: index for index, domain in enumerate(domains) if len(domain) == 1}
+
+        def _find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for index in parent:
+            configuration = domains[index][0]
+            for side in range(topology.side_counts[index]):
+                neighbor = topology.neighbor(index, side)
+                reverse = topology.reverse_side(index, side)
+                if not is_connection(configuration, side):
+                    continue
+                if neighbor < 0:
+                    return None
+                if neighbor not in parent or (neighbor, reverse) < (index, side):
+                    continue
+                if not is_connection(domains[neighbor][0], reverse):
+                    return None
+                root, neighbor_root = _find(index), _find(neighbor)
+                if root == neighbor_root:
+                    return None
+                parent[root] = neighbor_root
+        return {index: _find(index) for index in parent}
+
+    def _find_regions(self, domains: List[List[int]]) -> List[List[int]]:
+        # Connected groups of unresolved tiles, each in breadth first order so the search stays connected
+        topology = self.puzzle.topology
+        regions = []
+        visited = set()
+        for start, domain in enumerate(domains):
+            if len(domain) == 1 or start in visited:
+                continue
+            visited.add(start)
+            region = []
+            queue = deque([start])
+            while queue:
+                index = queue.popleft()
+                region.append(index)
+                for side in range(topology.side_counts[index]):
+                    neighbor = topology.neighbor(index, side)
+                    if neighbor >= 0 and neighbor not in visited and len(domains[neighbor]) > 1:
+                        visited.add(neighbor)
+                        queue.append(neighbor)
+            regions.append(region)
+        return regions
+
+    def _count_region(self, region: List[int], domains: List[List[int]],
+                      fixed_components: Dict[int, int]) -> Tuple[Dict[Signature, int], List[int]]:
+        # Describes the region relative to itself, so regions with the same shape and surroundings share their counts
+        topology = self.puzzle.topology
+        local = {index: position for position, index in enumerate(region)}
+        labels: List[int] = []
+        key = []
+        for index in region:
+            links = []
+            for side in range(topology.side_counts[index]):
+                neighbor = topology.neighbor(index, side)
+                reverse = topology.reverse_side(index, side)
+                if neighbor < 0:
+                    links.append(None)
+                elif neighbor in local:
+                    links.append(('region', local[neighbor], reverse))
+                else:
+                    component = fixed_components[neighbor]
+                    if component not in labels:
+                        labels.append(component)
+                    links.append(('fixed', int(is_connection(domains[neighbor][0], reverse)), labels.index(component)))
+            key.append((tuple(domains[index]), tuple(links)))
+        region_key = tuple(key)
+        if region_key in self.region_cache:
+            self.cache_hits += 1
+        else:
+            self.region_cache[region_key] = RegionCounter(region_key, len(labels), self.limit).count()
+        return self.region_cache[region_key], labels
+
+    @staticmethod
+    def _join(partition: Tuple[Tuple[int, ...], ...],
+              groups: List[Tuple[int, ...]]) -> Optional[Tuple[Tuple[int, ...], ...]]:
+        # Joins the fixed networks of every group, joining two networks that are already joined closes a loop
+        blocks = [set(block) for block in partition]
+        for group in groups:
+            joined = set()
+            touched = []
+            for component in group:
+                block = next((block for block in blocks if component in block), None)
+                if block is None:
+                    if component in joined:
+                        return None
+                    joined.add(component)
+                elif any(block is other for other in touched):
+                    return None
+                else:
+                    touched.append(block)
+                    joined |= block
+            blocks = [block for block in blocks if not any(block is other for other in touched)] + [joined]
+        return tuple(sorted(tuple(sorted(block)) for block in blocks))
+
+
+class RegionCounter:
+    links: List[Tuple[SideLink, ...]]
+    initial_domains: List[List[int]]
+    label_count: int
+    limit: int
+    table: Dict[Signature, int]
+    target: Optional[Signature]
+
+    def __init__(self, region_key: RegionKey, label_count: int, limit: int):
+        self.initial_domains = [list(domain) for domain, _ in region_key]
+        self.links = [links for _, links in region_key]
+        self.label_count = label_count
+        self.limit = limit
+        self.table = {}
+        # Next to at most one fixed network the caller only uses a single signature, the search can stop once that
+        # one reached the limit. The counts of the other signatures are incomplete then.
+        self.target = (((), 0) if label_count else ((), 1)) if label_count <= 1 else None
+
+    def count(self) -> Dict[Signature, int]:
+        domains = [[configuration for configuration in domain if self._fits_surroundings(tile, configuration)]
+                   for tile, domain in enumerate(self.initial_domains)]
+        # Union find over the tiles of the region followed by the fixed networks around it
+        parent = list(range(len(domains) + self.label_count))
+        self._search(domains, parent, [False] * len(domains))
+        return self.table
+
+    def _fits_surroundings(self, tile: int, configuration: int) -> bool:
+        for side, link in enumerate(self.links[tile]):
+            connection = is_connection(configuration, side)
+            if link is None and connection:
+                return False
+            if link is not None and link[0] == 'fixed' and connection != bool(link[1]):
+                return False
+        return True
+
+    def _search(self, domains: List[List[int]], parent: List[int], committed: List[bool]) -> None:
+        if self._done() or not self._propagate(domains):
+            return
+        # Join every tile that has a single configuration left with its committed neighbors
+        for tile, domain in enumerate(domains):
+            if committed[tile] or len(domain) > 1:
+                continue
+            committed[tile] = True
+            for side, link in enumerate(self.links[tile]):
+                if link is None or not is_connection(domain[0], side):
+                    continue
+                if link[0] == 'fixed':
+                    other = len(domains) + link[2]
+                elif committed[link[1]]:
+                    other = link[1]
+                else:
+                    continue
+                root, other_root = _find(parent, tile), _find(parent, other)
+                if root == other_root:
+                    return
+                parent[root] = other_root
+        open_tiles = [tile for tile, domain in enumerate(domains) if len(domain) > 1]
+        if not open_tiles:
+            self._record(parent, len(domains))
+            return
+        tile = min(open_tiles, key=lambda t: len(domains[t]))
+        for configuration in domains[tile]:
+            if self._done():
+                return
+            next_domains = [list(domain) for domain in domains]
+            next_domains[tile] = [configuration]
+            self._search(next_domains, list(parent), list(committed))
+
+    def _done(self) -> bool:
+        return self.target is not None and self.table.get(self.target, 0) >= self.limit
+
+    def _propagate(self, domains: List[List[int]]) -> bool:
+        queue = deque(range(len(domains)))
+        queued = [True] * len(domains)
+        while queue:
+            tile = queue.popleft()
+            queued[tile] = False
+            remaining = [configuration for configuration in domains[tile]
+                         if self._fits_neighbors(domains, tile, configuration)]
+            if len(remaining) == len(domains[tile]):
+                continue
+            if not remaining:
+                return False
+            domains[tile] = remaining
+            for link in self.links[tile]:
+                if link is not None and link[0] == 'region' and not queued[link[1]]:
+                    queued[link[1]] = True
+                    queue.append(link[1])
+        return True
+
+    def _fits_neighbors(self, domains: List[List[int]], tile: int, configuration: int) -> bool:
+        for side, link in enumerate(self.links[tile]):
+            if link is None or link[0] != 'region':
+                continue
+            connection = is_connection(configuration, side)
+            if not any(is_connection(other, link[2]) == connection for other in domains[link[1]]):
+                return False
+        return True
+
+    def _record(self, parent: List[int], tile_count: int) -> None:
+        groups: Dict[int, List[int]] = {}
+        for label in range(self.label_count):
+            groups.setdefault(_find(parent, tile_count + label), []).append(label)
+        closed = len({_find(parent, tile) for tile in range(tile_count)} - set(groups))
+        signature = (tuple(sorted(tuple(group) for group in groups.values() if len(group) > 1)), closed)
+        self.table[signature] = min(self.table.get(signature, 0) + 1, self.limit)
+
+
+def _find(parent: List[int], node: int) -> int:
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
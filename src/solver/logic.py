@@ -1,20 +1,44 @@
 from collections import deque
+from typing import Optional
 
+from checkpoint import Checkpoint
+from profiler import PROFILER
 from puzzle import Puzzle, Tile
+from solver.propagation import propagate_bulk
 from util import is_connection
 
 
 class LogicSolver:
     puzzle: Puzzle
+    checkpoint: Optional[Checkpoint]
     solve_order: int
 
-    def __init__(self, puzzle: Puzzle):
+    def __init__(self, puzzle: Puzzle, checkpoint: Optional[Checkpoint] = None):
         self.puzzle = puzzle
-        self.solve_order = 0
+        self.checkpoint = checkpoint
+        # Continue after the tiles that were resolved before, e.g. when resuming from a checkpoint
+        self.solve_order = max((tile.solve_order for tile in puzzle.tiles), default=-1) + 1
 
     def solve(self) -> None:
-        for tile in sorted(self.puzzle.tiles, key=lambda t: (t.y, t.x)):
-            self._solve_one(tile)
+        self.puzzle.release_inconsistent_locks()
+        for tile in self.puzzle.tiles:
+            if tile.locked and tile.solve_order == -1:
+                self._apply_configuration(tile)
+        bulk_resolved = propagate_bulk(self.puzzle)
+        for tile in bulk_resolved:
+            self._apply_configuration(tile)
+        sorted_tiles = sorted(self.puzzle.tiles, key=lambda t: (t.y, t.x))
+        while True:
+            solve_order = self.solve_order
+            with PROFILER.span('logic_sweep'):
+                for tile in sorted_tiles:
+                    self._solve_one(tile)
+                    if self.checkpoint:
+                        self.checkpoint.maybe_save(self.puzzle)
+            # Tiles resolved in bulk never queued their neighbors, the components they merged can rule out
+            # configurations of tiles an earlier sweep already passed, so sweep until nothing gets resolved
+            if not bulk_resolved or self.solve_order == solve_order:
+                break
 
     def _solve_one(self, start_tile: Tile):
         tile_queue = deque()
@@ -30,14 +54,17 @@ class LogicSolver:
                     changed = True
             if changed:
                 if len(tile.possible_configurations) == 1:
-                    assert tile.solve_order == -1
-                    self._merge_neighbors(tile)
-                    tile.solve_order = self.solve_order
-                    self.solve_order += 1
+                    self._apply_configuration(tile)
                 for neighbor in tile.neighbors:
                     if neighbor and len(neighbor.possible_configurations) > 1:
                         tile_queue.appendleft(neighbor)
 
+    def _apply_configuration(self, tile: Tile):
+        assert tile.solve_order == -1
+        self._merge_neighbors(tile)
+        tile.solve_order = self.solve_order
+        self.solve_order += 1
+
     def _check_configuration_possible(self, tile: Tile, configuration: int) -> bool:
         for i in range(len(tile.neighbors)):
             connection = is_connection(configuration, i)
@@ -55,7 +82,7 @@ class LogicSolver:
                 if c1.component_exits + c2.component_exits - 2 == 0 and \
                         c1.component_size + c2.component_size != len(self.puzzle.tiles):
                     return False
-            reverse_index = self._get_reverse_index(tile, neighbor)
+            reverse_index = self.puzzle.topology.reverse_side(tile.index, i)
             if not self._check_connection_possible(neighbor, reverse_index, connection):
                 return False
         return True
@@ -66,12 +93,6 @@ class LogicSolver:
                 return True
         return False
 
-    def _get_reverse_index(self, tile: Tile, neighbor: Tile) -> int:
-        for i in range(len(neighbor.neighbors)):
-            if neighbor.neighbors[i] == tile:
-                return i
-        raise Exception("No reverse neighbor found")
-
     def _merge_neighbors(self, tile: Tile):
         configuration = next(iter(tile.possible_configurations))
         for i in range(len(tile.neighbors)):
@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import sys
+import time
+from queue import Empty
+from typing import List, Tuple, Dict, Optional, Any
+
+from puzzle import Puzzle
+from topology import get_topology
+
+DEFAULT_PORTFOLIO = 'logic,bt,bt:depth=2,bt:seed=1,bt:seed=2'
+# Short option names that can be used in configurations
+OPTION_ALIASES = {'depth': 'max_depth'}
+RESULT_POLL_INTERVAL = 0.1
+
+# Everything a worker needs to rebuild the puzzle: the topology key, the initial and the possible configurations
+# and the locked tiles
+PuzzleState = Tuple[Tuple[str, int, int, bool], List[int], List[List[int]], List[bool]]
+# Possible configurations and solve order of every tile
+SolverResult = Tuple[List[List[int]], List[int]]
+
+
+def parse_configurations(configurations: str) -> List[Tuple[str, Dict[str, int]]]:
+    # Configurations are separated by commas, each is a solver name followed by options like bt:depth=2:seed=1
+    parsed = []
+    for configuration in configurations.split(','):
+        name, *options = configuration.strip().split(':')
+        parsed_options = {}
+        for option in options:
+            key, _, value = option.partition('=')
+            if not value:
+                raise Exception(f"Solver option '{option}' of '{configuration}' needs a value")
+            parsed_options[key] = int(value)
+        parsed.append((name, parsed_options))
+    return parsed
+
+
+def _run_configuration(configuration: str, name: str, options: Dict[str, int], state: PuzzleState,
+                       results: Any) -> None:
+    # The solvers report their progress on stdout, which would interleave between the workers
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results.put((configuration, solve_state(
+            name, {OPTION_ALIASES.get(key, key): value for key, value in options.items()}, state)))
+    except Exception as e:
+        results.put((configuration, str(e)))
+
+
+def puzzle_state(puzzle: Puzzle) -> PuzzleState:
+    topology = puzzle.topology
+    if topology is None:
+        raise Exception("Solving in another process needs a puzzle with a topology")
+    return ((topology.kind, topology.width, topology.height, topology.wrap),
+            [tile.initial_configuration for tile in puzzle.tiles],
+            [sorted(tile.possible_configurations) for tile in puzzle.tiles],
+            [tile.locked for tile in puzzle.tiles])
+
+
+def solve_state(name: str, options: Dict[str, Any], state: PuzzleState) -> SolverResult:
+    # Runs in the other process, only the state goes there and only the result comes back
+    from registry import SOLVERS
+
+    puzzle = _build_puzzle(state)
+    SOLVERS.load(name)(puzzle, **options).solve()
+    return [sorted(tile.possible_configurations) for tile in puzzle.tiles], [tile.solve_order for tile in puzzle.tiles]
+
+
+def apply_result(puzzle: Puzzle, result: SolverResult) -> None:
+    possible_configurations, solve_orders = result
+    for tile, possible, solve_order in zip(puzzle.tiles, possible_configurations, solve_orders):
+        tile.possible_configurations = set(possible)
+        tile.solve_order = solve_order
+
+
+def _build_puzzle(state: PuzzleState) -> Puzzle:
+    topology_key, configurations, possible_configurations, locked = state
+    puzzle = Puzzle.from_topology(get_topology(*topology_key), configurations)
+    for tile, possible, tile_locked in zip(puzzle.tiles, possible_configurations, locked):
+        tile.possible_configurations = set(possible)
+        tile.locked = tile_locked
+    return puzzle
+
+
+class PortfolioSolver:
+    puzzle: Puzzle
+    configurations: List[Tuple[str, Dict[str, int]]]
+    winner: Optional[str]
+
+    def __init__(self, puzzle: Puzzle, configurations: str = DEFAULT_PORTFOLIO):
+        self.puzzle = puzzle
+        self.configurations = parse_configurations(configurations or DEFAULT_PORTFOLIO)
+        self.winner = None
+
+    def solve(self):
+        if self.puzzle.topology is None:
+            raise Exception("The portfolio solver needs a puzzle with a topology")
+        # Released tiles have to be known here as well, the apply unlocks them
+        self.puzzle.release_inconsistent_locks()
+        state = puzzle_state(self.puzzle)
+
+        start = time.perf_counter()
+        results = multiprocessing.Queue()
+        workers = []
+        for name, options in self.configurations:
+            configuration = ':'.join([name] + [f"{key}={value}" for key, value in options.items()])
+            worker = multiprocessing.Process(target=_run_configuration,
+                                             args=(configuration, name, options, state, results), daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        # The first complete solution wins, otherwise the result that resolved the most tiles
+        best: Optional[Tuple[str, SolverResult]] = None
+        pending = len(workers)
+        try:
+            while pending:
+                try:
+                    configuration, result = results.get(timeout=RESULT_POLL_INTERVAL)
+                except Empty:
+                    if not any(worker.is_alive() for worker in workers) and results.empty():
+                        break
+                    continue
+                pending -= 1
+                if isinstance(result, str):
+                    print(f"Portfolio configuration {configuration} failed: {result}")
+                    continue
+                resolved = sum(len(possible) == 1 for possible in result[0])
+                print(f"Portfolio configuration {configuration} finished after {time.perf_counter() - start:.2f}s "
+                      f"with {resolved}/{len(self.puzzle.tiles)} tiles resolved.")
+                if best is None or resolved > sum(len(possible) == 1 for possible in best[1][0]):
+                    best = (configuration, result)
+                if resolved == len(self.puzzle.tiles):
+                    break
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
+
+        if best is None:
+            print("No portfolio configuration produced a result.")
+            return
+        self.winner = best[0]
+        apply_result(self.puzzle, best[1])
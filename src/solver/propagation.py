@@ -0,0 +1,136 @@
+from typing import List, Dict, Any
+
+from profiler import profiled
+from puzzle import Puzzle, Tile
+from topology import Topology
+
+# Smaller boards are settled faster by the scalar passes than it takes to set up the arrays
+BULK_PROPAGATION_MIN_TILES = 1000
+
+
+class TopologyArrays:
+    # Index arrays of a topology, shared by all puzzles of the same size. The numpy arrays are typed as Any, numpy
+    # is only imported once it is needed.
+    sides: Any
+    side_range: Any
+    valid: Any
+    shift_back: Any
+    neighbors: Any
+    missing: Any
+    neighbor_sides: Any
+    popcount: Any
+    rotations: List[List[int]]
+
+    def __init__(self, topology: Topology):
+        import numpy as np
+
+        count = len(topology.side_counts)
+        stride = topology.stride
+        self.sides = np.frombuffer(topology.side_counts, dtype=np.int8).astype(np.int64)
+        self.side_range = np.arange(stride)
+        self.valid = self.side_range[None, :] < self.sides[:, None]
+        self.shift_back = np.maximum(self.sides[:, None] - self.side_range[None, :], 0)
+        self.neighbors = np.frombuffer(topology.neighbors, dtype=np.int32).reshape(count, stride).astype(np.int64)
+        reverse = np.frombuffer(topology.reverse, dtype=np.int8).reshape(count, stride).astype(np.int64)
+        self.missing = self.neighbors < 0
+        self.neighbor_sides = np.where(self.missing, 0, self.neighbors * stride + reverse)
+        self.popcount = np.array([bin(value).count('1') for value in range(256)], dtype=np.int8)
+        self.rotations = [[rotation for rotation in range(stride) if mask >> rotation & 1] for mask in range(256)]
+
+
+_topology_arrays: Dict[Topology, TopologyArrays] = {}
+
+
+@profiled('bulk_propagation')
+def propagate_bulk(puzzle: Puzzle) -> List[Tile]:
+    # Filters the configurations of all tiles at once until no neighbor or border constraint removes anything.
+    # Returns the tiles that were resolved by this, in the order they were resolved.
+    if puzzle.topology is None or len(puzzle.tiles) < BULK_PROPAGATION_MIN_TILES:
+        return []
+    # Only imported here to keep numpy out of the startup of small and offline runs
+    import numpy as np
+
+    topology = puzzle.topology
+    tiles = puzzle.tiles
+    count = len(tiles)
+    stride = topology.stride
+    if topology not in _topology_arrays:
+        _topology_arrays[topology] = TopologyArrays(topology)
+    arrays = _topology_arrays[topology]
+    sides = arrays.sides
+    side_range = arrays.side_range
+    valid = arrays.valid
+    neighbors = arrays.neighbors
+    missing = arrays.missing
+    neighbor_sides = arrays.neighbor_sides
+    popcount = arrays.popcount
+
+    # configurations[tile, rotation], rotations a tile does not have repeat the initial configuration
+    initial = np.array([tile.initial_configuration for tile in tiles], dtype=np.int32)
+    configurations = ((initial[:, None] << side_range[None, :]) | (initial[:, None] >> arrays.shift_back)) & \
+        ((1 << sides) - 1)[:, None]
+    configurations = np.where(valid, configurations, initial[:, None])
+
+    # The domain of a tile is a bitmask of its possible rotations. connect_masks[tile, side] holds the rotations
+    # that connect the side, disconnect_masks[tile, side] the ones that leave it closed. Symmetric tiles repeat
+    # configurations, distinct_masks only holds the first rotation of each configuration.
+    connect_masks = np.zeros((count, stride), dtype=np.uint8)
+    full_domain = np.zeros(count, dtype=np.uint8)
+    distinct_masks = np.zeros(count, dtype=np.uint8)
+    for rotation in range(stride):
+        configuration = configurations[:, rotation]
+        present = valid[:, rotation]
+        connected = ((configuration[:, None] >> side_range[None, :]) & 1).astype(bool) & present[:, None]
+        connect_masks |= connected.astype(np.uint8) << rotation
+        full_domain |= present.astype(np.uint8) << rotation
+        distinct = present & (configurations[:, :rotation] != configuration[:, None]).all(axis=1)
+        distinct_masks |= distinct.astype(np.uint8) << rotation
+    disconnect_masks = np.where(valid, full_domain[:, None] & ~connect_masks, 0).astype(np.uint8)
+
+    domain = full_domain.copy()
+    possible_counts = np.array([len(tile.possible_configurations) for tile in tiles])
+    # Tiles that were already restricted before keep their restrictions
+    for index in np.nonzero(possible_counts != popcount[distinct_masks])[0].tolist():
+        possible = tiles[index].possible_configurations
+        domain[index] = sum(1 << rotation for rotation, configuration in enumerate(configurations[index].tolist())
+                            if rotation < sides[index] and configuration in possible)
+    initial_domain = domain.copy()
+
+    # Two dead ends connected to each other would form a closed network
+    dead_end = popcount[initial & 0xff] == 1
+    may_connect = ~missing & ~(dead_end[:, None] & dead_end[np.where(missing, 0, neighbors)] & (count > 2))
+
+    can_connect = ((domain[:, None] & connect_masks) != 0).reshape(-1)
+    can_disconnect = ((domain[:, None] & disconnect_masks) != 0).reshape(-1)
+    resolved_at = np.where(popcount[domain & distinct_masks] == 1, 0, -1)
+    active = np.arange(count)
+    iteration = 0
+    while active.size:
+        iteration += 1
+        # Remove the rotations that need a connection the neighbor can not make or a closed side it can not have
+        neighbor_connect = may_connect[active] & can_connect[neighbor_sides[active]]
+        neighbor_disconnect = missing[active] | can_disconnect[neighbor_sides[active]]
+        remove = np.bitwise_or.reduce(np.where(neighbor_connect, 0, connect_masks[active]) |
+                                      np.where(neighbor_disconnect, 0, disconnect_masks[active]), axis=1)
+        new_domain = domain[active] & ~remove.astype(np.uint8)
+        changed_mask = new_domain != domain[active]
+        changed = active[changed_mask]
+        domain[changed] = new_domain[changed_mask]
+        can_connect.reshape(count, stride)[changed] = (domain[changed, None] & connect_masks[changed]) != 0
+        can_disconnect.reshape(count, stride)[changed] = (domain[changed, None] & disconnect_masks[changed]) != 0
+        newly_resolved = changed[(resolved_at[changed] == -1) &
+                                 (popcount[domain[changed] & distinct_masks[changed]] == 1)]
+        resolved_at[newly_resolved] = iteration
+        # Only the neighbors of changed tiles can lose rotations in the next iteration
+        affected = np.zeros(count + 1, dtype=bool)
+        affected[neighbors[changed]] = True
+        active = np.flatnonzero(affected[:count])
+
+    rotations = arrays.rotations
+    configuration_lists = configurations.tolist()
+    domains = domain.tolist()
+    for index in np.flatnonzero(domain != initial_domain).tolist():
+        configuration_list = configuration_lists[index]
+        tiles[index].possible_configurations = {configuration_list[rotation] for rotation in rotations[domains[index]]}
+    resolved = np.nonzero(resolved_at > 0)[0]
+    return [tiles[index] for index in resolved[np.argsort(resolved_at[resolved], kind='stable')].tolist()]
@@ -0,0 +1,52 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_PUZZLE = os.path.join(SOURCE_DIR, '..', 'examples', 'bt1.json')
+IMAGING_CHECK = '''
+import contextlib, io, sys
+sys.argv = ['main.py', '--puzzle-file', {puzzle!r}]
+import main
+with contextlib.redirect_stdout(io.StringIO()):
+    main.main()
+print(','.join(sorted(m for m in ('PIL', 'ui', 'uibridge.hexagonal') if m in sys.modules)))
+'''
+
+
+def measure(command: list, runs: int) -> list:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, cwd=SOURCE_DIR, stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold start')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--puzzle', default=EXAMPLE_PUZZLE)
+    args = parser.parse_args()
+
+    scenarios = {
+        'interpreter': ['-c', 'pass'],
+        'import manager': ['-c', 'import manager'],
+        'offline load': ['main.py', '--puzzle-file', args.puzzle, '--no-solve'],
+        'offline solve': ['main.py', '--puzzle-file', args.puzzle],
+    }
+    for name, command in scenarios.items():
+        durations = measure(command, args.runs)
+        print(f"{name}: median {statistics.median(durations) * 1000:.0f}ms, min {min(durations) * 1000:.0f}ms")
+
+    result = subprocess.run([sys.executable, '-c', IMAGING_CHECK.format(puzzle=args.puzzle)], cwd=SOURCE_DIR,
+                            stdout=subprocess.PIPE, check=True)
+    imported = result.stdout.decode('utf-8').strip()
+    print("Imaging modules loaded by offline solve:", imported or "none")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import math
+import random
+import time
+from typing import List, Tuple, Set, Optional
+
+from PIL import Image, ImageDraw
+
+from loader import read_puzzle_file
+from topology import get_topology
+from ui import UI
+from uibridge.hexagonal import PUZZLE_BOX_BORDER, TILE_BORDER, TILE_BACKGROUND, TILE_LOCKED_BACKGROUND, \
+    PIPE_BACKGROUND, NEIGHBORS
+from util import rotate_configuration
+
+PAGE_BACKGROUND = (248, 248, 248)
+VIEW_BACKGROUND = (240, 240, 240)
+BOX_BORDER_WIDTH = 2
+CLICK_THRESHOLD = 10
+CONTENT_MARGIN = 20
+
+
+class SyntheticPuzzle:
+    width: int
+    height: int
+    configurations: List[int]
+    locked: Set[int]
+
+    def __init__(self, width: int, height: int, configurations: List[int]):
+        self.width = width
+        self.height = height
+        self.configurations = list(configurations)
+        self.locked = set()
+
+    @staticmethod
+    def from_json(path: str) -> "SyntheticPuzzle":
+        topology, configurations = read_puzzle_file(path)
+        if topology.kind != 'hexagonal' or topology.wrap:
+            raise Exception("Only hexagonal puzzles without wrapping can be rendered")
+        return SyntheticPuzzle(topology.width, topology.height, configurations)
+
+    @staticmethod
+    def generate(width: int, height: int, seed: int = 0) -> Tuple["SyntheticPuzzle", List[int]]:
+        rng = random.Random(seed)
+        solution = get_topology('hexagonal', width, height).random_tree(rng)
+        scrambled = [rotate_configuration(c, rng.randrange(NEIGHBORS), NEIGHBORS) for c in solution]
+        return SyntheticPuzzle(width, height, scrambled), solution
+
+    def is_solved(self) -> bool:
+        return get_topology('hexagonal', self.width, self.height).is_solution(self.configurations)
+
+
+class SyntheticUI(UI):
+    puzzle: SyntheticPuzzle
+    window_size: Tuple[int, int]
+    view_box: Tuple[int, int, int, int]
+    radius: float
+    zoom_step: float
+    pan: Tuple[float, float]
+    drag_ratio: float
+    miss_rate: float
+    missed_clicks: int
+    rng: random.Random
+    commands: int
+    command_latency: float
+    next_puzzle: Optional[Tuple[SyntheticPuzzle, int]]
+    mouse: Tuple[int, int]
+
+    def __init__(self, puzzle: SyntheticPuzzle, window_size: Tuple[int, int] = (1280, 900),
+                 view_box: Tuple[int, int, int, int] = (40, 120, 1240, 860), radius: float = 32,
+                 zoom_step: float = 1.25):
+        super().__init__('Synthetic')
+        self.wid = '0'
+        self.puzzle = puzzle
+        self.window_size = window_size
+        self.view_box = view_box
+        self.radius = radius
+        self.zoom_step = zoom_step
+        self.pan = (0, 0)
+        self.drag_ratio = 1.0
+        # Share of tile clicks that get lost, like clicks during lag in a real browser
+        self.miss_rate = 0.0
+        self.missed_clicks = 0
+        self.rng = random.Random(0)
+        self.commands = 0
+        # Time a real xdotool or import call takes, spent sleeping so several windows can overlap it
+        self.command_latency = 0.0
+        self.next_puzzle = None
+        self.mouse = (0, 0)
+
+    def focus_window(self) -> None:
+        self._command()
+
+    def get_screenshot(self) -> Image:
+        return self.capture()
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None) -> Image:
+        self._command()
+        if self.next_puzzle is not None:
+            puzzle, captures = self.next_puzzle
+            if captures > 0:
+                self.next_puzzle = (puzzle, captures - 1)
+            else:
+                self.puzzle = puzzle
+                self.next_puzzle = None
+        im = Image.new("RGB", self.window_size, PAGE_BACKGROUND)
+        draw = ImageDraw.Draw(im)
+        box = self.view_box
+        draw.rectangle((box[0] - BOX_BORDER_WIDTH, box[1] - BOX_BORDER_WIDTH,
+                        box[2] + BOX_BORDER_WIDTH - 1, box[3] + BOX_BORDER_WIDTH - 1), outline=PUZZLE_BOX_BORDER,
+                       width=BOX_BORDER_WIDTH)
+        view = Image.new("RGB", (box[2] - box[0], box[3] - box[1]), VIEW_BACKGROUND)
+        self._render(view)
+        im.paste(view, (box[0], box[1]))
+        return im.crop(region) if region else im
+
+    def wait_until_stable(self, timeout: float = 0) -> float:
+        # Rendering is synchronous, so the view is always stable
+        self.settle_stats.add(0)
+        return 0
+
+    def mouse_move(self, x: int, y: int) -> None:
+        self._command()
+        self.mouse = (x, y)
+
+    def mouse_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
+        self._command()
+        self.mouse = (x, y)
+        for _ in range(repeat):
+            self._click(x, y, button, False)
+
+    def mouse_ctrl_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
+        self._command()
+        self.mouse = (x, y)
+        for _ in range(repeat):
+            self._click(x, y, button, True)
+
+    def mouse_clicks(self, clicks: List[Tuple[int, int, int, int, bool]]) -> None:
+        self._command()
+        for x, y, button, repeat, ctrl in clicks:
+            self.mouse = (x, y)
+            for _ in range(repeat):
+                self._click(x, y, button, ctrl)
+
+    def mouse_drag(self, x: int, y: int, dx: int, dy: int, button: int = 1) -> None:
+        self.mouse_drag_path(x, y, [(dx, dy)], button)
+
+    def mouse_drag_path(self, x: int, y: int, delta: List[Tuple[int, int]], button: int = 1) -> None:
+        self._command()
+        distance = 0
+        dx = 0
+        dy = 0
+        for d in delta:
+            dx += d[0]
+            dy += d[1]
+            distance = max(distance, abs(dx), abs(dy))
+        self.mouse = (x + dx, y + dy)
+        if distance < CLICK_THRESHOLD:
+            self._click(x, y, button, False)
+            return
+        if button != 1 or not self._in_view(x, y):
+            return
+        for d in delta:
+            self._set_pan(self.pan[0] - d[0] * self.drag_ratio, self.pan[1] - d[1] * self.drag_ratio)
+        self.wait_until_stable()
+
+    def key_down(self, keycode: str) -> None:
+        self._command()
+
+    def key_up(self, keycode: str) -> None:
+        self._command()
+
+    def key_press(self, keycode: str) -> None:
+        self._command()
+
+    def show_puzzle_after(self, puzzle: SyntheticPuzzle, captures: int = 1) -> None:
+        # Like a game that loads the next puzzle a while after the last one was finished
+        self.next_puzzle = (puzzle, captures)
+
+    def tile_center(self, x: int, y: int) -> Tuple[float, float]:
+        width = math.sqrt(3) * self.radius
+        return (CONTENT_MARGIN + width / 2 + (x + (0.5 if y % 2 == 1 else 0)) * width,
+                CONTENT_MARGIN + self.radius + y * 1.5 * self.radius)
+
+    def content_size(self) -> Tuple[float, float]:
+        width = math.sqrt(3) * self.radius
+        return (2 * CONTENT_MARGIN + (self.puzzle.width + 0.5) * width,
+                2 * CONTENT_MARGIN + 2 * self.radius + (self.puzzle.height - 1) * 1.5 * self.radius)
+
+    def _command(self) -> None:
+        self.commands += 1
+        if self.command_latency:
+            time.sleep(self.command_latency)
+
+    def _view_size(self) -> Tuple[int, int]:
+        return self.view_box[2] - self.view_box[0], self.view_box[3] - self.view_box[1]
+
+    def _content_origin(self) -> Tuple[float, float]:
+        content = self.content_size()
+        view = self._view_size()
+        return tuple(-self.pan[i] if content[i] > view[i] else (view[i] - content[i]) / 2 for i in range(2))
+
+    def _set_pan(self, x: float, y: float) -> None:
+        content = self.content_size()
+        view = self._view_size()
+        self.pan = (max(0.0, min(content[0] - view[0], x)), max(0.0, min(content[1] - view[1], y)))
+
+    def _in_view(self, x: int, y: int) -> bool:
+        return self.view_box[0] <= x < self.view_box[2] and self.view_box[1] <= y < self.view_box[3]
+
+    def _tile_at(self, x: int, y: int) -> int:
+        origin = self._content_origin()
+        cx = x - self.view_box[0] - origin[0]
+        cy = y - self.view_box[1] - origin[1]
+        row = int(round((cy - self.radius) / (1.5 * self.radius)))
+        best = -1
+        best_dist = self.radius ** 2
+        for ty in (row - 1, row, row + 1):
+            if not 0 <= ty < self.puzzle.height:
+                continue
+            width = math.sqrt(3) * self.radius
+            column = int(round((cx - width / 2) / width - (0.5 if ty % 2 == 1 else 0)))
+            for tx in (column - 1, column, column + 1):
+                if not 0 <= tx < self.puzzle.width:
+                    continue
+                center = self.tile_center(tx, ty)
+                dist = (center[0] - cx) ** 2 + (center[1] - cy) ** 2
+                if dist < best_dist:
+                    best = ty * self.puzzle.width + tx
+                    best_dist = dist
+        return best
+
+    def _click(self, x: int, y: int, button: int, ctrl: bool) -> None:
+        if not self._in_view(x, y):
+            return
+        if button in (4, 5):
+            # Zooming keeps the top left corner of the view fixed
+            factor = self.zoom_step if button == 4 else 1 / self.zoom_step
+            self.radius *= factor
+            self._set_pan(self.pan[0] * factor, self.pan[1] * factor)
+            return
+        index = self._tile_at(x, y)
+        if index < 0:
+            return
+        if self.miss_rate and self.rng.random() < self.miss_rate:
+            self.missed_clicks += 1
+            return
+        if button == 3:
+            self.puzzle.locked.symmetric_difference_update({index})
+        elif button == 1 and index not in self.puzzle.locked:
+            rotations = NEIGHBORS - 1 if ctrl else 1
+            self.puzzle.configurations[index] = rotate_configuration(
+                self.puzzle.configurations[index], rotations, NEIGHBORS)
+
+    def _render(self, view: Image) -> None:
+        draw = ImageDraw.Draw(view)
+        origin = self._content_origin()
+        radius = self.radius
+        width = math.sqrt(3) * radius
+        border_width = max(1, int(radius / 20))
+        pipe_width = max(2, int(radius * 0.3))
+        first_row = max(0, int((-origin[1]) // (1.5 * radius)) - 1)
+        last_row = min(self.puzzle.height - 1, int((view.size[1] - origin[1]) // (1.5 * radius)) + 1)
+        first_column = max(0, int((-origin[0]) // width) - 1)
+        last_column = min(self.puzzle.width - 1, int((view.size[0] - origin[0]) // width) + 1)
+        for y in range(first_row, last_row + 1):
+            for x in range(first_column, last_column + 1):
+                center = self.tile_center(x, y)
+                cx = origin[0] + center[0]
+                cy = origin[1] + center[1]
+                index = y * self.puzzle.width + x
+                corners = [(cx + radius * math.cos(math.radians(angle)), cy + radius * math.sin(math.radians(angle)))
+                           for angle in range(-90, 270, 60)]
+                background = TILE_LOCKED_BACKGROUND if index in self.puzzle.locked else TILE_BACKGROUND
+                draw.polygon(corners, fill=background, outline=TILE_BORDER, width=border_width)
+                configuration = self.puzzle.configurations[index]
+                for direction in range(NEIGHBORS):
+                    if configuration & (1 << direction):
+                        angle = direction / NEIGHBORS * math.tau
+                        end = (cx + math.cos(angle) * width / 2 * 0.9, cy + math.sin(angle) * width / 2 * 0.9)
+                        draw.line((cx, cy) + end, fill=PIPE_BACKGROUND, width=pipe_width)
+                draw.ellipse((cx - pipe_width / 2, cy - pipe_width / 2, cx + pipe_width / 2, cy + pipe_width / 2),
+                             fill=PIPE_BACKGROUND)
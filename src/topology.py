@@ -0,0 +1,282 @@
+from array import array
+from typing import List, Tuple, Optional, Dict, Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from random import Random
+
+# Sides of every tile are numbered clockwise, so rotating a configuration by one bit rotates the tile by one side.
+# A link is the position of the neighboring tile together with the side of the neighbor that points back.
+Position = Tuple[int, int]
+Link = Optional[Tuple[Position, int]]
+TileLinks = List[Tuple[Position, List[Link]]]
+
+HEXAGONAL_SIDES = 6
+SQUARE_SIDES = 4
+
+
+class Topology:
+    kind: str
+    width: int
+    height: int
+    wrap: bool
+    positions: List[Position]
+    side_counts: array
+    stride: int
+    neighbors: array
+    reverse: array
+
+    def __init__(self, kind: str, width: int, height: int, wrap: bool, tiles: TileLinks):
+        self.kind = kind
+        self.width = width
+        self.height = height
+        self.wrap = wrap
+        self.positions = [position for position, _ in tiles]
+        self.side_counts = array('b', [len(links) for _, links in tiles])
+        self.stride = max(self.side_counts)
+        # Flat tables indexed by tile * stride + side, -1 marks a missing neighbor
+        self.neighbors = array('i', [-1]) * (len(tiles) * self.stride)
+        self.reverse = array('b', [-1]) * (len(tiles) * self.stride)
+        lookup = {position: index for index, position in enumerate(self.positions)}
+        for index, (_, links) in enumerate(tiles):
+            for side, link in enumerate(links):
+                if link is not None:
+                    self.neighbors[index * self.stride + side] = lookup[link[0]]
+                    self.reverse[index * self.stride + side] = link[1]
+
+    def tile_count(self) -> int:
+        return len(self.positions)
+
+    def neighbor(self, index: int, side: int) -> int:
+        return self.neighbors[index * self.stride + side]
+
+    def reverse_side(self, index: int, side: int) -> int:
+        return self.reverse[index * self.stride + side]
+
+    def is_solution(self, configurations: List[int]) -> bool:
+        # Every connection has to be matched by the neighbor, loops and separate networks are not detected
+        for index, configuration in enumerate(configurations):
+            for side in range(self.side_counts[index]):
+                connection = configuration & (1 << side) > 0
+                neighbor = self.neighbor(index, side)
+                if neighbor < 0:
+                    if connection:
+                        return False
+                elif connection != (configurations[neighbor] & (1 << self.reverse_side(index, side)) > 0):
+                    return False
+        return True
+
+    def random_tree(self, rng: "Random") -> List[int]:
+        configurations = [0] * self.tile_count()
+        visited = {0}
+        frontier = [(0, side) for side in range(self.side_counts[0])]
+        while frontier:
+            index, side = frontier.pop(rng.randrange(len(frontier)))
+            neighbor = self.neighbor(index, side)
+            if neighbor < 0 or neighbor in visited:
+                continue
+            visited.add(neighbor)
+            configurations[index] |= 1 << side
+            configurations[neighbor] |= 1 << self.reverse_side(index, side)
+            frontier.extend((neighbor, i) for i in range(self.side_counts[neighbor]))
+        return configurations
+
+
+def _position(x: int, y: int, width: int, height: int, wrap: bool) -> Optional[Position]:
+    if wrap:
+        return x % width, y % height
+    if 0 <= x < width and 0 <= y < height:
+        return x, y
+    return None
+
+
+def _link(position: Optional[Position], side: int) -> Link:
+    return (position, side) if position is not None else None
+
+
+def _hexagonal_neighbor(x: int, y: int, side: int) -> Position:
+    even = y % 2 == 0
+    return [
+        (x + 1, y),
+        (x if even else x + 1, y + 1),
+        (x - 1 if even else x, y + 1),
+        (x - 1, y),
+        (x - 1 if even else x, y - 1),
+        (x if even else x + 1, y - 1),
+    ][side]
+
+
+def _build_hexagonal(width: int, height: int, wrap: bool) -> TileLinks:
+    # Sides start east, odd rows are shifted half a tile to the right
+    if wrap and height % 2 != 0:
+        raise Exception("Wrapping hexagonal grids need an even height")
+    tiles = []
+    for y in range(height):
+        for x in range(width):
+            links = []
+            for side in range(HEXAGONAL_SIDES):
+                neighbor = _hexagonal_neighbor(x, y, side)
+                links.append(_link(_position(neighbor[0], neighbor[1], width, height, wrap),
+                                   (side + HEXAGONAL_SIDES // 2) % HEXAGONAL_SIDES))
+            tiles.append(((x, y), links))
+    return tiles
+
+
+def _build_square(width: int, height: int, wrap: bool) -> TileLinks:
+    # Sides are east, south, west, north
+    tiles = []
+    for y in range(height):
+        for x in range(width):
+            links = [_link(_position(x + dx, y + dy, width, height, wrap), (side + 2) % SQUARE_SIDES)
+                     for side, (dx, dy) in enumerate(((1, 0), (0, 1), (-1, 0), (0, -1)))]
+            tiles.append(((x, y), links))
+    return tiles
+
+
+def _build_octagonal(width: int, height: int, wrap: bool) -> TileLinks:
+    # Octagon (x, y) is at position (2x, y) with its sides starting east. The square south east of it is at
+    # position (2x + 1, y) with its sides starting south east. Octagons link to each other with their even sides.
+    def _octagon(x: int, y: int) -> Optional[Position]:
+        position = _position(x, y, width, height, wrap)
+        return (2 * position[0], position[1]) if position is not None else None
+
+    def _square(x: int, y: int) -> Optional[Position]:
+        position = _position(x, y, width, height, wrap)
+        return (2 * position[0] + 1, position[1]) if position is not None else None
+
+    tiles = []
+    for y in range(height):
+        for x in range(width):
+            tiles.append(((2 * x, y), [
+                _link(_octagon(x + 1, y), 4),
+                _link(_square(x, y), 2),
+                _link(_octagon(x, y + 1), 6),
+                _link(_square(x - 1, y), 3),
+                _link(_octagon(x - 1, y), 0),
+                _link(_square(x - 1, y - 1), 0),
+                _link(_octagon(x, y - 1), 2),
+                _link(_square(x, y - 1), 1),
+            ]))
+            tiles.append(((2 * x + 1, y), [
+                _link(_octagon(x + 1, y + 1), 5),
+                _link(_octagon(x, y + 1), 7),
+                _link(_octagon(x, y), 1),
+                _link(_octagon(x + 1, y), 3),
+            ]))
+    return tiles
+
+
+def _build_etrar(width: int, height: int, wrap: bool) -> TileLinks:
+    # Elongated triangular tiling: even rows hold `width` squares, every other square row is shifted half a square
+    # to the right. Odd rows hold 2 * `width` triangles, the one pointing down below square x is at 2x and the one
+    # pointing up above square x of the next row is at 2x + 1. Squares have their sides starting east, triangles
+    # pointing down start north and triangles pointing up start south.
+    if wrap and height % 4 != 0:
+        raise Exception("Wrapping etrar grids need a height divisible by 4")
+
+    def _row(y: int) -> Optional[int]:
+        if wrap:
+            return y % height
+        return y if 0 <= y < height else None
+
+    def _at(x: int, y: Optional[int], count: int, offset: int) -> Optional[Position]:
+        if y is None:
+            return None
+        if wrap:
+            x %= count
+        elif not 0 <= x < count:
+            return None
+        return 2 * x + offset if offset >= 0 else x, y
+
+    def _square(x: int, y: Optional[int]) -> Optional[Position]:
+        return _at(x, y, width, -1)
+
+    def _down(x: int, y: Optional[int]) -> Optional[Position]:
+        return _at(x, y, width, 0)
+
+    def _up(x: int, y: Optional[int]) -> Optional[Position]:
+        return _at(x, y, width, 1)
+
+    tiles = []
+    for y in range(height):
+        if y % 2 == 0:
+            for x in range(width):
+                tiles.append(((x, y), [
+                    _link(_square(x + 1, y), 2),
+                    _link(_down(x, _row(y + 1)), 0),
+                    _link(_square(x - 1, y), 0),
+                    _link(_up(x, _row(y - 1)), 0),
+                ]))
+            continue
+        # Along the strip the triangles alternate, which one comes first depends on the shift of the row above
+        shifted = (y // 2) % 2 == 1
+        for x in range(width):
+            tiles.append(((2 * x, y), [
+                _link(_square(x, _row(y - 1)), 1),
+                _link(_up(x + 1 if shifted else x, y), 1),
+                _link(_up(x if shifted else x - 1, y), 2),
+            ]))
+            tiles.append(((2 * x + 1, y), [
+                _link(_square(x, _row(y + 1)), 3),
+                _link(_down(x - 1 if shifted else x, y), 1),
+                _link(_down(x if shifted else x + 1, y), 2),
+            ]))
+    return tiles
+
+
+def _build_cube(width: int, height: int, wrap: bool) -> TileLinks:
+    # Every cell of a hexagonal grid shows a cube made of a top, a left and a right face at positions 3x, 3x + 1
+    # and 3x + 2. The faces are squares in 3D, so each has four sides numbered clockwise.
+    if wrap and height % 2 != 0:
+        raise Exception("Wrapping cube grids need an even height")
+
+    def _face(x: int, y: int, face: int, side: int) -> Optional[Position]:
+        neighbor = _hexagonal_neighbor(x, y, side)
+        position = _position(neighbor[0], neighbor[1], width, height, wrap)
+        return (3 * position[0] + face, position[1]) if position is not None else None
+
+    tiles = []
+    for y in range(height):
+        for x in range(width):
+            top = (3 * x, y)
+            left = (3 * x + 1, y)
+            right = (3 * x + 2, y)
+            tiles.append((top, [
+                _link(_face(x, y, 1, 5), 2),
+                (right, 3),
+                (left, 0),
+                _link(_face(x, y, 2, 4), 1),
+            ]))
+            tiles.append((left, [
+                (top, 2),
+                (right, 2),
+                _link(_face(x, y, 0, 2), 0),
+                _link(_face(x, y, 2, 3), 0),
+            ]))
+            tiles.append((right, [
+                _link(_face(x, y, 1, 0), 3),
+                _link(_face(x, y, 0, 1), 3),
+                (left, 1),
+                (top, 1),
+            ]))
+    return tiles
+
+
+BUILDERS: Dict[str, Callable[[int, int, bool], TileLinks]] = {
+    'hexagonal': _build_hexagonal,
+    'square': _build_square,
+    'octagonal': _build_octagonal,
+    'octogonal': _build_octagonal,
+    'etrar': _build_etrar,
+    'cube': _build_cube,
+}
+
+_topologies: Dict[Tuple[str, int, int, bool], Topology] = {}
+
+
+def get_topology(kind: str, width: int, height: int, wrap: bool = False) -> Topology:
+    key = (kind, width, height, wrap)
+    if key not in _topologies:
+        if kind not in BUILDERS:
+            raise Exception(f"Unknown grid {kind}")
+        _topologies[key] = Topology(kind, width, height, wrap, BUILDERS[kind](width, height, wrap))
+    return _topologies[key]
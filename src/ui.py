@@ -1,46 +1,118 @@
 import os
 import subprocess
 import tempfile
-from typing import List, Tuple
+import time
+import zlib
+from typing import List, Tuple, Optional
 
 from PIL import Image
 
+from profiler import PROFILER, profiled
+
+STABLE_POLL_INTERVAL = 0.02
+STABLE_TIMEOUT = 1.0
+STABLE_DOWNSAMPLE = 8
+
+
+class SettleStats:
+    count: int
+    total: float
+    maximum: float
+
+    def __init__(self):
+        # Loops wait for the window thousands of times, so only a running summary is kept
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, settle_time: float) -> None:
+        self.count += 1
+        self.total += settle_time
+        self.maximum = max(self.maximum, settle_time)
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0
+        return f"{self.count} waits, {self.total:.2f}s in total, mean {mean * 1000:.0f}ms, " \
+               f"max {self.maximum * 1000:.0f}ms"
+
 
 class UI:
     window_name: str
     wid: str
+    stable_region: Optional[Tuple[int, int, int, int]]
+    settle_stats: SettleStats
 
     def __init__(self, window_name: str):
         self.window_name = window_name
+        self.stable_region = None
+        self.settle_stats = SettleStats()
+
+    def _run(self, command: List[str], **kwargs) -> subprocess.CompletedProcess:
+        # External commands are timed per tool and xdotool subcommand, they dominate the time spent in the window
+        start = time.perf_counter()
+        try:
+            return subprocess.run(command, **kwargs)
+        finally:
+            PROFILER.record_command(' '.join(command[:2]) if command[0] == 'xdotool' else command[0],
+                                    time.perf_counter() - start)
 
     def focus_window(self) -> None:
-        res = subprocess.run(
-            ['xdotool', 'search', '--onlyvisible', '--limit', '1', '--sync', '--name', self.window_name],
-            stdout=subprocess.PIPE
-        )
-        self.wid = res.stdout.decode('utf-8').strip()
-        subprocess.run(['xdotool', 'windowactivate', '--sync', self.wid])
+        # Windows can also be given by their id, which tells apart several windows with the same title
+        if self.window_name.isdigit() or self.window_name.startswith('0x'):
+            self.wid = str(int(self.window_name, 16 if self.window_name.startswith('0x') else 10))
+        else:
+            res = self._run(
+                ['xdotool', 'search', '--onlyvisible', '--limit', '1', '--sync', '--name', self.window_name],
+                stdout=subprocess.PIPE
+            )
+            self.wid = res.stdout.decode('utf-8').strip()
+        self._run(['xdotool', 'windowactivate', '--sync', self.wid])
 
     def get_screenshot(self) -> Image:
         self.focus_window()
         self.mouse_move(0, 0)
+        return self.capture()
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None) -> Image:
+        command = ['import', '-silent', '-window', self.wid]
+        if region:
+            command.extend(['-crop', f'{region[2] - region[0]}x{region[3] - region[1]}+{region[0]}+{region[1]}',
+                            '+repage'])
         with tempfile.TemporaryDirectory(prefix='autopipes') as tempdir:
             screenfile = os.path.join(tempdir, 'screen.png')
-            subprocess.run(['import', '-silent', '-window', self.wid, screenfile])
+            self._run(command + [screenfile])
             im = Image.open(screenfile)
         return im
 
+    def capture_checksum(self, region: Optional[Tuple[int, int, int, int]] = None) -> int:
+        return zlib.crc32(self.capture(region).reduce(STABLE_DOWNSAMPLE).tobytes())
+
+    @profiled('wait_until_stable')
+    def wait_until_stable(self, timeout: float = STABLE_TIMEOUT) -> float:
+        # Poll cheap downsampled captures until two consecutive ones match
+        start = time.monotonic()
+        previous = None
+        while True:
+            checksum = self.capture_checksum(self.stable_region)
+            if checksum == previous or time.monotonic() - start > timeout:
+                break
+            previous = checksum
+            time.sleep(STABLE_POLL_INTERVAL)
+        settle_time = time.monotonic() - start
+        self.settle_stats.add(settle_time)
+        return settle_time
+
     def mouse_move(self, x: int, y: int) -> None:
-        subprocess.run(['xdotool', 'mousemove', str(x), str(y)])
+        self._run(['xdotool', 'mousemove', str(x), str(y)])
 
     def mouse_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
-        subprocess.run(
+        self._run(
             ['xdotool',
              'mousemove', str(x), str(y),
              'click', '--repeat', str(repeat), str(button)])
 
     def mouse_ctrl_click(self, x: int, y: int, button: int, repeat: int = 1) -> None:
-        subprocess.run(
+        self._run(
             ['xdotool',
              'mousemove', str(x), str(y),
              'keydown', 'ctrl',
@@ -48,29 +120,44 @@ class UI:
              'keyup', 'ctrl'
              ])
 
+    def mouse_clicks(self, clicks: List[Tuple[int, int, int, int, bool]]) -> None:
+        # Runs (x, y, button, repeat, ctrl) clicks in a single xdotool invocation
+        command = ['xdotool']
+        for x, y, button, repeat, ctrl in clicks:
+            command.extend(['mousemove', str(x), str(y)])
+            if ctrl:
+                command.extend(['keydown', 'ctrl'])
+            command.extend(['click', '--repeat', str(repeat), str(button)])
+            if ctrl:
+                command.extend(['keyup', 'ctrl'])
+        if len(command) > 1:
+            self._run(command)
+
     def mouse_drag(self, x: int, y: int, dx: int, dy: int, button: int = 1) -> None:
         self.mouse_drag_path(x, y, [(dx, dy)], button)
 
     def mouse_drag_path(self, x: int, y: int, delta: List[Tuple[int, int]], button: int = 1) -> None:
-        moves = []
+        # The whole path is a single xdotool call, the view only has to settle once the button is released
+        command = ['xdotool', 'mousemove', str(x), str(y), 'mousedown', str(button)]
         dx = 0
         dy = 0
         for d in delta:
             dx += d[0]
             dy += d[1]
-            moves.extend(['mousemove', str(x + dx), str(y + dy), 'sleep', '0.2'])
-        subprocess.run(
-            ['xdotool',
-             'mousemove', str(x), str(y),
-             'mousedown', str(button)] +
-            moves +
-            ['mouseup', str(button)])
+            command.extend(['mousemove', str(x + dx), str(y + dy)])
+        command.extend(['mouseup', str(button)])
+        self._run(command)
+        self.wait_until_stable()
+
+    def flush(self) -> None:
+        # Input is sent right away, windows that share the input with others hold it back until they flush
+        pass
 
     def key_down(self, keycode: str) -> None:
-        subprocess.run(['xdotool', 'keydown', str(keycode)])
+        self._run(['xdotool', 'keydown', str(keycode)])
 
     def key_up(self, keycode: str) -> None:
-        subprocess.run(['xdotool', 'keyup', str(keycode)])
+        self._run(['xdotool', 'keyup', str(keycode)])
 
     def key_press(self, keycode: str) -> None:
-        subprocess.run(['xdotool', 'key', str(keycode)])
+        self._run(['xdotool', 'key', str(keycode)])
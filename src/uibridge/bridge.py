@@ -8,5 +8,6 @@ class Bridge(ABC):
     def read_puzzle(self, confirm_read: bool) -> Puzzle:
         pass
 
-    def apply_puzzle(self, puzzle: Puzzle, solve_order: bool) -> None:
+    def apply_puzzle(self, puzzle: Puzzle, solve_order: bool, lock_unchanged: bool = False,
+                     dry_run: bool = False, verify: bool = False) -> None:
         pass
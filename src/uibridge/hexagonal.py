@@ -1,13 +1,19 @@
 import math
-import time
-from typing import Tuple
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Tuple, Optional, List
 
-from PIL import Image
+from PIL import Image, ImageChops, ImageStat
 
-from puzzle import Puzzle, Tile
+from calibration import CalibrationCache
+from profiler import PROFILER, profiled
+from puzzle import Puzzle
 from ui import UI
 from uibridge.bridge import Bridge
-from util import color_dist_sq, required_rotations
+from uibridge.planner import ActionPlanner, ActionPlan, TileAction
+from topology import get_topology
+from util import color_dist_sq, required_rotations, rotate_configuration
 
 PUZZLE_BOX_BORDER = (208, 221, 233)
 PUZZLE_BOX_BORDER_MARGIN = 10
@@ -15,9 +21,37 @@ TILE_BORDER = (170, 170, 170)
 TILE_BORDER_MARGIN = 3
 TILE_BACKGROUND = (221, 221, 221)
 TILE_BACKGROUND_MARGIN = 3
+TILE_LOCKED_BACKGROUND = (187, 204, 221)
+# Locked backgrounds are sampled between the pipe directions, relative to the sample radius of the pipes
+LOCKED_SAMPLE_DISTANCE = 1.25
 PIPE_BACKGROUND = (255, 255, 255)
 PIPE_BACKGROUND_MARGIN = 3
 NEIGHBORS = 6
+MOSAIC_DEBUG_SCALE = 0.25
+ANALYSIS_WORKERS = 2
+PAN_EDGE_MARGIN = 20
+PAN_MIN_DRAG = 20
+PAN_MAX_CORRECTIONS = 2
+# Views scroll by fractions of a pixel, so the end of the view is only known up to a pixel
+PAN_TOLERANCE = 1
+PAN_VERIFY_RANGE = 6
+PAN_VERIFY_ERROR = 0.05
+# Drags that measure the ratio might be off by this much
+PAN_RATIO_ERROR = 0.5
+PAN_VERIFY_SCALE = 4
+PAN_VERIFY_LEVELS = 2
+PAN_VERIFY_STRIP = 32
+CALIBRATION_TILE_SIZE_MARGIN = 2
+VERIFY_MAX_ROUNDS = 5
+
+
+def _overlap_difference(reference: Image, offset: Image, dx: int, dy: int) -> float:
+    # Mean difference of the part both images show when the view moved by (dx, dy) between them
+    width, height = reference.size
+    diff = ImageChops.difference(
+        reference.crop((max(0, dx), max(0, dy), min(width, width + dx), min(height, height + dy))),
+        offset.crop((max(0, -dx), max(0, -dy), min(width, width - dx), min(height, height - dy))))
+    return sum(ImageStat.Stat(diff).mean)
 
 
 class TileParameters:
@@ -45,6 +79,29 @@ class ViewState:
         self.total_size = (0, 0)
 
 
+class ScanPlan:
+    frames: Tuple[int, int]
+    scroll_amount: Tuple[int, int]
+    last_offset: Tuple[int, int]
+    borders: Tuple[int, int, int, int]
+
+    def __init__(self, frames: Tuple[int, int], scroll_amount: Tuple[int, int], last_offset: Tuple[int, int],
+                 borders: Tuple[int, int, int, int]):
+        self.frames = frames
+        self.scroll_amount = scroll_amount
+        self.last_offset = last_offset
+        self.borders = borders
+
+    def frame_offset(self, column: int, row: int) -> Tuple[int, int]:
+        def _offset(index: int, count: int, scroll_amount: int, last_offset: int) -> int:
+            if index == count - 1 and index > 0:
+                return (index - 1) * scroll_amount + last_offset
+            return index * scroll_amount
+
+        return (_offset(column, self.frames[0], self.scroll_amount[0], self.last_offset[0]),
+                _offset(row, self.frames[1], self.scroll_amount[1], self.last_offset[1]))
+
+
 class HexagonalBridge(Bridge):
     ui: UI
     puzzle_box: Tuple[int, int, int, int]
@@ -52,137 +109,339 @@ class HexagonalBridge(Bridge):
     tile_parameters: TileParameters
     puzzle_image: Image
     view_state: ViewState
+    streaming_read: bool
+    mosaic_scale: float
+    tile_configurations: array
+    tile_locked: array
+    mosaic: Optional[Image.Image]
+    verify_pans: bool
+    pan_ratio: List[float]
+    calibration_cache: Optional[CalibrationCache]
+    window_size: Tuple[int, int]
+    zoom_level: int
 
-    def __init__(self, ui: UI):
+    def __init__(self, ui: UI, streaming_read: bool = False, mosaic_scale: float = 0, verify_pans: bool = False,
+                 calibration_cache: Optional[CalibrationCache] = None):
         self.ui = ui
         self.puzzle_box = (0, 0, 0, 0)
         self.puzzle_size = (0, 0)
         self.tile_parameters = TileParameters((0, 0), (0, 0), (0, 0))
         self.puzzle_image = Image.new("RGB", (1, 1))
         self.view_state = ViewState()
+        self.streaming_read = streaming_read
+        self.mosaic_scale = mosaic_scale
+        self.tile_configurations = array('b')
+        self.tile_locked = array('b')
+        self.mosaic = None
+        self.verify_pans = verify_pans
+        self.pan_ratio = [1.0, 1.0]
+        self.calibration_cache = calibration_cache
+        self.window_size = (0, 0)
+        self.zoom_level = 0
 
     def read_puzzle(self, confirm_read: bool) -> Puzzle:
         self.ui.focus_window()
-        self._init_puzzle_view_parameters()
+        # The last apply might have left the view panned, the calibration is measured at the origin
+        if self.view_state.view_offset != (0, 0):
+            self._pan_view_to_offset((0, 0))
+        if self.streaming_read:
+            self._init_puzzle_view_parameters_streaming(confirm_read)
+        else:
+            self._init_puzzle_view_parameters()
         puzzle = self._read_puzzle(confirm_read)
         self._print_puzzle(puzzle)
         return puzzle
 
-    def apply_puzzle(self, puzzle: Puzzle, solve_order: bool) -> None:
+    def apply_puzzle(self, puzzle: Puzzle, solve_order: bool, lock_unchanged: bool = False,
+                     dry_run: bool = False, verify: bool = False) -> None:
+        plan = self.plan_apply(puzzle, solve_order, lock_unchanged)
+        print("Apply plan:", plan.cost)
+        if dry_run:
+            return
         self.ui.focus_window()
-        block_width = self.view_state.view_size[0] // self.tile_parameters.grid_size[0] // 2
-        block_height = self.view_state.view_size[1] // self.tile_parameters.grid_size[1] // 2
-        if solve_order:
-            tiles = sorted(puzzle.tiles, key=lambda t: t.solve_order)
-        else:
-            tiles = sorted(puzzle.tiles,
-                           key=lambda t: (
-                               t.y // block_height,
-                               (t.x // block_width) * (1 if (t.y // block_height) % 2 == 0 else -1),
-                               t.y,
-                               t.x * (1 if t.y % 2 == 0 else -1)
-                           ))
+        self._execute_plan(plan)
+        if verify:
+            self._verify_apply(puzzle, plan)
+
+    @profiled('execute')
+    def _execute_plan(self, plan: ActionPlan) -> None:
+        for window in plan.windows:
+            self._pan_view_to_offset(window.offset)
+            clicks = []
+            for action in window.actions:
+                click_x = self.puzzle_box[0] + action.center[0] - self.view_state.view_offset[0]
+                click_y = self.puzzle_box[1] + action.center[1] - self.view_state.view_offset[1]
+                assert (self.puzzle_box[0] <= click_x <= self.puzzle_box[2])
+                assert (self.puzzle_box[1] <= click_y <= self.puzzle_box[3])
+                if action.unlock:
+                    clicks.append((click_x, click_y, 3, 1, False))
+                if action.rotations > 0:
+                    clicks.append((click_x, click_y, 1, action.rotations, action.ctrl))
+                if action.lock:
+                    clicks.append((click_x, click_y, 3, 1, False))
+            PROFILER.count('clicks', sum(click[3] for click in clicks))
+            self.ui.mouse_clicks(clicks)
+
+    @profiled('plan')
+    def plan_apply(self, puzzle: Puzzle, solve_order: bool, lock_unchanged: bool = False) -> ActionPlan:
+        tiles = sorted(puzzle.tiles, key=lambda t: t.solve_order) if solve_order else puzzle.tiles
+        actions = []
         for tile in tiles:
-            if len(tile.possible_configurations) != 1:
+            if len(tile.possible_configurations) != 1 or tile.locked:
                 continue
             target_configuration = next(iter(tile.possible_configurations))
             rotations = required_rotations(tile.initial_configuration, target_configuration, NEIGHBORS)
-            self._click_tile(tile.x, tile.y, 1, NEIGHBORS - rotations < rotations,
-                             min(rotations, NEIGHBORS - rotations))
-            self._click_tile(tile.x, tile.y, 3)
+            # Released tiles are still locked in the window, they stay that way when they already show the solution
+            if rotations == 0 and (not lock_unchanged or tile.lock_released):
+                continue
+            actions.append(self._rotate_action(tile.x, tile.y, rotations, tile.lock_released))
+        planner = self._planner()
+        if solve_order:
+            return planner.plan_in_order(actions, self.view_state.view_offset)
+        return planner.plan(actions, self.view_state.view_offset)
 
-    def _click_tile(self, x: int, y: int, button: int, ctrl: bool = False, repeat: int = 1):
-        if repeat <= 0:
-            return
-        center = self._get_tile_center(x, y)
-        self._pan_view_to_include_point(center[0], center[1])
-        click_x = self.puzzle_box[0] + center[0] - self.view_state.view_offset[0]
-        click_y = self.puzzle_box[1] + center[1] - self.view_state.view_offset[1]
-        assert (self.puzzle_box[0] <= click_x <= self.puzzle_box[2])
-        assert (self.puzzle_box[1] <= click_y <= self.puzzle_box[3])
-        if ctrl:
-            self.ui.mouse_ctrl_click(click_x, click_y, button, repeat)
-        else:
-            self.ui.mouse_click(click_x, click_y, button, repeat)
+    def _planner(self) -> ActionPlanner:
+        return ActionPlanner(
+            self.view_state.view_size, self.view_state.total_size, self.view_state.scrollable,
+            (int(self.tile_parameters.grid_size[0]), int(self.tile_parameters.grid_size[1])),
+            self._pan_step())
 
-    def _pan_view_to_include_point(self, x: int, y: int):
+    def _rotate_action(self, x: int, y: int, rotations: int, unlock: bool = False) -> TileAction:
+        return TileAction(x, y, self._get_tile_center(x, y), min(rotations, NEIGHBORS - rotations),
+                          NEIGHBORS - rotations < rotations, True, unlock)
+
+    @profiled('verify')
+    def _verify_apply(self, puzzle: Puzzle, plan: ActionPlan) -> None:
+        # Walks the windows of the plan again and only repairs the tiles that do not show their solution. Tiles that
+        # got locked although their rotation was missed have to be unlocked first.
+        solutions = {(tile.x, tile.y): next(iter(tile.possible_configurations)) for tile in puzzle.tiles
+                     if len(tile.possible_configurations) == 1}
+        for verify_round in range(VERIFY_MAX_ROUNDS + 1):
+            repairs = []
+            unknown = 0
+            for window in plan.windows:
+                self._pan_view_to_offset(window.offset)
+                self.ui.wait_until_stable()
+                im = self._puzzle_box_screenshot()
+                for action in window.actions:
+                    solution = solutions[(action.x, action.y)]
+                    if self._shows_configuration(im, action.x, action.y, self.view_state.view_offset, solution):
+                        continue
+                    shown = self._decode_tile(im, action.x, action.y, self.view_state.view_offset)
+                    rotations = required_rotations(shown, solution, NEIGHBORS)
+                    if rotate_configuration(shown, rotations, NEIGHBORS) != solution:
+                        unknown += 1
+                        continue
+                    locked = self._is_tile_locked(im, action.x, action.y, self.view_state.view_offset)
+                    repairs.append(self._rotate_action(action.x, action.y, rotations, locked))
+            print(f"Verification round {verify_round + 1}: {len(repairs)} tiles to repair"
+                  + (f", {unknown} tiles could not be read" if unknown else ""))
+            if not repairs:
+                return
+            PROFILER.count('repairs', len(repairs))
+            if verify_round == VERIFY_MAX_ROUNDS:
+                print("Giving up on repairing tiles.")
+                return
+            plan = self._planner().plan(repairs, self.view_state.view_offset)
+            self._execute_plan(plan)
+
+    @profiled('pan')
+    def _pan_view_to_offset(self, target: Tuple[int, int]):
         state = self.view_state
+        target = tuple(self._clamp_view_offset(target[i], i) for i in range(2))
+        max_drag = self._pan_step()
+        if not self.verify_pans:
+            self._drag_view_by((target[0] - state.view_offset[0], target[1] - state.view_offset[1]), max_drag)
+            state.view_offset = target
+            return
 
-        def _calc_target(target: int, target_border: int, size: int, offset: int, total_size: int) -> int:
-            if target - target_border < offset or target + target_border > offset + size:
-                return max(0, min(total_size - size, target - size // 2))
-            return offset
+        corrections = 0
+        while any(abs(target[i] - state.view_offset[i]) > PAN_TOLERANCE for i in range(2)):
+            step = tuple(max(-max_drag[i], min(max_drag[i], target[i] - state.view_offset[i])) for i in range(2))
+            before = self.ui.capture(self.puzzle_box)
+            mouse_delta = self._drag_view_by(step, max_drag)
+            moved = self._measure_pan(before, self.ui.capture(self.puzzle_box), step)
+            for i in range(2):
+                # Drags that hit the end of the view are clamped and say nothing about the ratio
+                if moved[i] and abs(mouse_delta[i]) >= PAN_MIN_DRAG and 0 < target[i] < self._max_view_offset(i):
+                    self.pan_ratio[i] = (self.pan_ratio[i] + moved[i] / -mouse_delta[i]) / 2
+            state.view_offset = (state.view_offset[0] + moved[0], state.view_offset[1] + moved[1])
+            for i in range(2):
+                # A view that does not move any further towards its end is there, even if it was expected elsewhere
+                if step[i] and not moved[i] and target[i] in (0, self._max_view_offset(i)):
+                    target = (state.view_offset[0], target[1]) if i == 0 else (target[0], state.view_offset[1])
+            # Views scroll by fractions of a pixel, so drags are only corrected when they missed by more
+            if any(abs(moved[i] - step[i]) > PAN_TOLERANCE for i in range(2)):
+                corrections += 1
+                if corrections > PAN_MAX_CORRECTIONS:
+                    print("Could not pan view to", target, "ended at", state.view_offset)
+                    return
 
-        def _perform_scrolls(offset: int, target: int, scroll_amount: int, dx: int, dy: int):
-            if target == offset:
-                return
-            diff = target - offset
+    def _drag_view_by(self, diff: Tuple[int, int], max_drag: Tuple[int, int]) -> Tuple[int, int]:
+        remaining = list(diff)
+        total_delta = [0, 0]
+        while remaining != [0, 0]:
+            # Move both axes with one diagonal drag, limited by what fits into the puzzle box
+            step = [max(-max_drag[i], min(max_drag[i], remaining[i])) for i in range(2)]
             # We need to swap the sign because dragging moves stuff in the other direction
-            direction = -1 if diff > 0 else 1
-            diff = abs(diff)
-            while diff >= scroll_amount:
-                self.ui.mouse_drag(
-                    (self.puzzle_box[0] + self.puzzle_box[2]) // 2,
-                    (self.puzzle_box[1] + self.puzzle_box[3]) // 2,
-                    scroll_amount * dx * direction,
-                    scroll_amount * dy * direction,
-                )
-                diff -= scroll_amount
-            if diff > 0:
+            delta = [-int(round(step[i] / self.pan_ratio[i])) for i in range(2)]
+            start = [self._pan_drag_start(delta[i], i) for i in range(2)]
+            if max(abs(delta[0]), abs(delta[1])) >= PAN_MIN_DRAG:
+                self.ui.mouse_drag(start[0], start[1], delta[0], delta[1])
+            else:
+                # Short drags are taken as clicks, so move further first and then back
+                axis = 0 if abs(delta[0]) >= abs(delta[1]) else 1
+                overshoot = [0, 0]
+                overshoot[axis] = PAN_MIN_DRAG if delta[axis] > 0 else -PAN_MIN_DRAG
+                intermediate = self.view_state.view_offset[axis] - overshoot[axis]
+                if not 0 <= intermediate <= self._max_view_offset(axis):
+                    overshoot[axis] = -overshoot[axis]
                 self.ui.mouse_drag_path(
                     (self.puzzle_box[0] + self.puzzle_box[2]) // 2,
                     (self.puzzle_box[1] + self.puzzle_box[3]) // 2,
-                    [(scroll_amount * dx * direction, scroll_amount * dy * direction),
-                     ((diff - scroll_amount) * dx * direction, (diff - scroll_amount) * dy * direction)],
+                    [(overshoot[0], overshoot[1]), (delta[0] - overshoot[0], delta[1] - overshoot[1])],
                 )
+            for i in range(2):
+                remaining[i] -= step[i]
+                total_delta[i] += delta[i]
+        return total_delta[0], total_delta[1]
+
+    def _measure_pan(self, before: Image, after: Image, expected: Tuple[int, int],
+                     error: float = PAN_VERIFY_ERROR) -> Tuple[int, int]:
+        def _search(reference: Image, offset: Image, center: Tuple[int, int], search_range: Tuple[int, int],
+                    strip_size: int) -> Tuple[int, int]:
+            candidates = [(center[0] + dx, center[1] + dy)
+                          for dx in range(-search_range[0], search_range[0] + 1)
+                          for dy in range(-search_range[1], search_range[1] + 1)]
+            # Only a horizontal and a vertical strip through the part every candidate overlaps are compared
+            width, height = reference.size
+            left = max(0, center[0] + search_range[0])
+            right = min(width, width + center[0] - search_range[0])
+            top = max(0, center[1] + search_range[1])
+            bottom = min(height, height + center[1] - search_range[1])
+            if left >= right or top >= bottom:
+                return min(candidates, key=lambda c: _overlap_difference(reference, offset, c[0], c[1]))
+            middle = ((left + right) // 2, (top + bottom) // 2)
+            strips = [(left, max(top, middle[1] - strip_size // 2), right, min(bottom, middle[1] + strip_size // 2)),
+                      (max(left, middle[0] - strip_size // 2), top, min(right, middle[0] + strip_size // 2), bottom)]
+            references = [reference.crop(strip) for strip in strips]
+
+            def _difference(candidate: Tuple[int, int]) -> float:
+                return sum(sum(ImageStat.Stat(ImageChops.difference(strip_reference, offset.crop(
+                    (strip[0] - candidate[0], strip[1] - candidate[1], strip[2] - candidate[0], strip[3] - candidate[1])
+                ))).mean) for strip, strip_reference in zip(strips, references))
+
+            return min(candidates, key=_difference)
+
+        # Comparing grayscale images is cheaper and still tells the shifts apart
+        before = before.convert('L')
+        after = after.convert('L')
+        # The drag ratio error grows with the distance, each axis only needs to be searched as far as it moved
+        scale = PAN_VERIFY_SCALE ** PAN_VERIFY_LEVELS
+        search_range = tuple((PAN_VERIFY_RANGE + int(abs(expected[i]) * error)) // scale + 1 for i in range(2))
+        moved = (expected[0] // scale, expected[1] // scale)
+        while True:
+            moved = _search(before.reduce(scale), after.reduce(scale), moved, search_range,
+                            max(1, PAN_VERIFY_STRIP // scale))
+            if scale == 1:
+                return moved
+            scale //= PAN_VERIFY_SCALE
+            moved = (moved[0] * PAN_VERIFY_SCALE, moved[1] * PAN_VERIFY_SCALE)
+            # The reduced images are off by at most half a reduced pixel
+            search_range = (PAN_VERIFY_SCALE // 2 + 1, PAN_VERIFY_SCALE // 2 + 1)
+
+    def _pan_step(self) -> Tuple[int, int]:
+        # The largest view offset change a single drag inside the puzzle box can achieve
+        max_drag = [(self.puzzle_box[i + 2] - self.puzzle_box[i] - 2 * PAN_EDGE_MARGIN) * self.pan_ratio[i]
+                    for i in range(2)]
+        if self.verify_pans:
+            # Keep half of the view overlapping so every drag can be measured
+            max_drag = [d / 2 for d in max_drag]
+        return int(max_drag[0]), int(max_drag[1])
+
+    def _pan_drag_start(self, delta: int, axis: int) -> int:
+        if delta > 0:
+            return self.puzzle_box[axis] + PAN_EDGE_MARGIN
+        if delta < 0:
+            return self.puzzle_box[axis + 2] - PAN_EDGE_MARGIN
+        return (self.puzzle_box[axis] + self.puzzle_box[axis + 2]) // 2
 
-        if state.scrollable[0]:
-            target_x = _calc_target(x, int(self.tile_parameters.grid_size[0]), state.view_size[0], state.view_offset[0],
-                                    state.total_size[0])
-            _perform_scrolls(state.view_offset[0], target_x, int(self.tile_parameters.grid_size[0] * 2), 1, 0)
-            state.view_offset = (target_x, state.view_offset[1])
-        if state.scrollable[1]:
-            target_y = _calc_target(y, int(self.tile_parameters.grid_size[1]), state.view_size[1], state.view_offset[1],
-                                    state.total_size[1])
-            _perform_scrolls(state.view_offset[1], target_y, int(self.tile_parameters.grid_size[1] * 2), 0, 1)
-            state.view_offset = (state.view_offset[0], target_y)
+    def _max_view_offset(self, axis: int) -> int:
+        return self.view_state.total_size[axis] - self.view_state.view_size[axis]
 
+    def _clamp_view_offset(self, offset: int, axis: int) -> int:
+        if not self.view_state.scrollable[axis]:
+            return self.view_state.view_offset[axis]
+        return max(0, min(self._max_view_offset(axis), offset))
+
+    @profiled('decode')
     def _read_puzzle(self, confirm_read: bool) -> Puzzle:
-        half_radius = min(self.tile_parameters.tile_size[0], self.tile_parameters.tile_size[1]) / 4
-        tiles = []
-        for y in range(self.puzzle_size[1]):
-            for x in range(self.puzzle_size[0]):
-                configuration = 0
-                tile_center = self._get_tile_center(x, y)
-                for angle in range(NEIGHBORS):
-                    xoff = int(math.cos(angle / NEIGHBORS * math.tau) * half_radius)
-                    yoff = int(math.sin(angle / NEIGHBORS * math.tau) * half_radius)
-                    if self._is_pipe_color(self.puzzle_image, tile_center[0] + xoff, tile_center[1] + yoff, 5,
-                                           confirm_read):
-                        configuration |= 1 << angle
-                tiles.append(Tile(x, y, configuration, NEIGHBORS))
-        puzzle = Puzzle(tiles)
+        configurations = []
         for y in range(self.puzzle_size[1]):
             for x in range(self.puzzle_size[0]):
-                tile = puzzle.get_tile(x, y)
-                tile.neighbors.append(puzzle.get_tile(x + 1, y))
-                tile.neighbors.append(puzzle.get_tile(x if y % 2 == 0 else x + 1, y + 1))
-                tile.neighbors.append(puzzle.get_tile(x - 1 if y % 2 == 0 else x, y + 1))
-                tile.neighbors.append(puzzle.get_tile(x - 1, y))
-                tile.neighbors.append(puzzle.get_tile(x - 1 if y % 2 == 0 else x, y - 1))
-                tile.neighbors.append(puzzle.get_tile(x if y % 2 == 0 else x + 1, y - 1))
+                if self.streaming_read:
+                    configurations.append(self.tile_configurations[y * self.puzzle_size[0] + x])
+                else:
+                    configurations.append(self._decode_tile(self.puzzle_image, x, y, (0, 0), confirm_read))
+        puzzle = Puzzle.from_topology(get_topology('hexagonal', self.puzzle_size[0], self.puzzle_size[1]),
+                                      configurations)
+        for tile in puzzle.tiles:
+            if self.tile_locked[tile.index] if self.streaming_read else \
+                    self._is_tile_locked(self.puzzle_image, tile.x, tile.y, (0, 0)):
+                tile.lock()
+        locked = sum(tile.locked for tile in puzzle.tiles)
+        if locked:
+            print(f"Found {locked} locked tiles")
         if confirm_read:
-            for y in range(self.puzzle_size[1]):
-                for x in range(self.puzzle_size[0]):
-                    center = self._get_tile_center(x, y)
-                    self.puzzle_image.putpixel(center, (0, 0, 255))
-            self.puzzle_image.show()
+            (self.mosaic if self.streaming_read else self.puzzle_image).show()
             print("Press enter to continue...")
             input()
-        for tile in tiles:
-            assert tile.initial_configuration != 0
+        for tile in puzzle.tiles:
+            if tile.initial_configuration == 0:
+                raise Exception(f"Tile at {tile.x}/{tile.y} shows no pipes, the puzzle size {self.puzzle_size} "
+                                f"is probably wrong")
         return puzzle
 
+    def _decode_tile(self, im: Image, x: int, y: int, origin: Tuple[int, int], color: bool = False) -> int:
+        tile_center = self._get_tile_center(x, y)
+        configuration = 0
+        for angle, point in enumerate(self._sample_points(x, y, origin)):
+            if self._is_pipe_color(im, point[0], point[1], 5, color):
+                configuration |= 1 << angle
+        if color:
+            im.putpixel((tile_center[0] - origin[0], tile_center[1] - origin[1]), (0, 0, 255))
+        return configuration
+
+    def _shows_configuration(self, im: Image, x: int, y: int, origin: Tuple[int, int], configuration: int) -> bool:
+        # Stops at the first side that differs instead of decoding the whole tile
+        for angle, point in enumerate(self._sample_points(x, y, origin)):
+            if self._is_pipe_color(im, point[0], point[1], 5) != (configuration & (1 << angle) > 0):
+                return False
+        return True
+
+    def _sample_points(self, x: int, y: int, origin: Tuple[int, int]) -> List[Tuple[int, int]]:
+        half_radius = self._sample_radius()
+        tile_center = self._get_tile_center(x, y)
+        return [(tile_center[0] + int(math.cos(angle / NEIGHBORS * math.tau) * half_radius) - origin[0],
+                 tile_center[1] + int(math.sin(angle / NEIGHBORS * math.tau) * half_radius) - origin[1])
+                for angle in range(NEIGHBORS)]
+
+    def _is_tile_locked(self, im: Image, x: int, y: int, origin: Tuple[int, int]) -> bool:
+        distance = self._sample_radius() * LOCKED_SAMPLE_DISTANCE
+        tile_center = self._get_tile_center(x, y)
+        locked = 0
+        for angle in range(NEIGHBORS):
+            direction = (angle + 0.5) / NEIGHBORS * math.tau
+            xx = tile_center[0] + int(math.cos(direction) * distance) - origin[0]
+            yy = tile_center[1] + int(math.sin(direction) * distance) - origin[1]
+            if 0 <= xx < im.size[0] and 0 <= yy < im.size[1] and \
+                    color_dist_sq(im.getpixel((xx, yy)), TILE_LOCKED_BACKGROUND) <= TILE_BACKGROUND_MARGIN:
+                locked += 1
+        return locked > NEIGHBORS // 2
+
+    def _sample_radius(self) -> float:
+        return min(self.tile_parameters.tile_size[0], self.tile_parameters.tile_size[1]) / 4
+
     def _print_puzzle(self, puzzle: Puzzle) -> None:
         for y in range(self.puzzle_size[1]):
             if y % 2 == 1:
@@ -197,38 +456,277 @@ class HexagonalBridge(Bridge):
                 int(self.tile_parameters.first_tile_offset[1] + y * self.tile_parameters.grid_size[1]))
 
     def _init_puzzle_view_parameters(self) -> None:
-        self._scroll_puzzle_box_into_view()
-        self.puzzle_box = self._find_puzzle_box(self.ui.get_screenshot())
-        self._zoom_puzzle()
-        self.tile_parameters = self._estimate_tile_parameters(self._puzzle_box_screenshot())
+        self._calibrate_view()
         self._take_complete_screenshot()
         # Taking the screenshot might have moved us
-        self.tile_parameters = self._estimate_tile_parameters(self.puzzle_image)
-        self.puzzle_size = self._find_puzzle_size(self.puzzle_image)
+        self.tile_parameters = self._measure_grid_size(self.puzzle_image,
+                                                       self._estimate_tile_parameters(self.puzzle_image))
+        self.puzzle_size = self._puzzle_size_from_borders(self._find_puzzle_borders(self.puzzle_image),
+                                                          self.tile_parameters)
         self.tile_parameters = self._determine_tile_parameters(self.puzzle_image, self.puzzle_size,
                                                                self.tile_parameters)
+        self._store_calibration()
 
         print("Puzzle size:", self.puzzle_size)
 
-    def _puzzle_box_screenshot(self) -> Image:
-        return self.ui.get_screenshot().crop(self.puzzle_box)
+    def _init_puzzle_view_parameters_streaming(self, confirm_read: bool) -> None:
+        self._calibrate_view()
+        plan = self._plan_streaming_scan()
+        self.puzzle_size = self._puzzle_size_from_borders(plan.borders, self.tile_parameters)
+        self.tile_parameters = self._grid_from_borders(plan.borders, self.puzzle_size, self.tile_parameters)
+        self._store_calibration()
+        self._stream_puzzle(plan, confirm_read)
 
-    def _find_puzzle_size(self, im: Image) -> Tuple[int, int]:
-        def _count_tiles(dx, dy):
-            count = 0
-            x = 0
-            y = 0
-            xx, yy = self._get_tile_center(x, y)
-            while xx < im.size[0] and yy < im.size[1] and self._is_pipe_color(im, xx, yy, 20):
-                count += 1
-                x += dx
-                y += dy
-                xx, yy = self._get_tile_center(x, y)
-            return count
+        print("Puzzle size:", self.puzzle_size)
+
+    @profiled('calibrate')
+    def _calibrate_view(self) -> None:
+        screenshot = self.ui.get_screenshot()
+        self.window_size = screenshot.size
+        if self.calibration_cache is not None:
+            entry = self.calibration_cache.load(self.ui.wid, self.window_size)
+            if entry is not None and self._restore_calibration(entry, screenshot):
+                print("Reusing calibration")
+                return
+            print("Calibrating view")
+        self.zoom_level = 0
+        self._scroll_puzzle_box_into_view()
+        self.puzzle_box = self._find_puzzle_box(self.ui.get_screenshot())
+        self.ui.stable_region = self.puzzle_box
+        self._zoom_puzzle()
+        self.tile_parameters = self._estimate_tile_parameters(self._puzzle_box_screenshot())
+
+    def _restore_calibration(self, entry: dict, screenshot: Image) -> bool:
+        puzzle_box = tuple(entry['puzzle_box'])
+        if not self._is_puzzle_box(screenshot, puzzle_box):
+            return False
+        cached_parameters = TileParameters(tuple(entry['tile_size']), tuple(entry['first_tile_offset']),
+                                           tuple(entry['grid_size']))
+        self.puzzle_box = puzzle_box
+        self.ui.stable_region = puzzle_box
+        tile_parameters = self._estimate_cached_tile_parameters(screenshot.crop(puzzle_box), cached_parameters)
+        if tile_parameters is None and entry['zoom_level'] > 0:
+            # A new puzzle resets the zoom, replay all zoom steps at once
+            im = screenshot.crop(puzzle_box)
+            borders = self._find_puzzle_borders(im)
+            self.ui.mouse_click(puzzle_box[0] + borders[0] + 10, puzzle_box[1] + borders[1] + 10, 4,
+                                entry['zoom_level'])
+            self.ui.wait_until_stable()
+            tile_parameters = self._estimate_cached_tile_parameters(self._puzzle_box_screenshot(), cached_parameters)
+        if tile_parameters is None:
+            return False
+        self.tile_parameters = tile_parameters
+        self.zoom_level = entry['zoom_level']
+        self.view_state.scrollable = tuple(entry['scrollable'])
+        self.view_state.view_size = tuple(entry['view_size'])
+        self.view_state.total_size = tuple(entry['total_size'])
+        return True
+
+    def _estimate_cached_tile_parameters(self, im: Image,
+                                         cached_parameters: TileParameters) -> Optional[TileParameters]:
+        try:
+            tile_parameters = self._estimate_tile_parameters(im)
+        except Exception:
+            return None
+        for i in range(2):
+            if abs(tile_parameters.tile_size[i] - cached_parameters.tile_size[i]) > CALIBRATION_TILE_SIZE_MARGIN:
+                return None
+        return tile_parameters
+
+    def _store_calibration(self) -> None:
+        if self.calibration_cache is None:
+            return
+        self.calibration_cache.store(self.ui.wid, self.window_size, {
+            'puzzle_box': self.puzzle_box,
+            'tile_size': self.tile_parameters.tile_size,
+            'first_tile_offset': self.tile_parameters.first_tile_offset,
+            'grid_size': self.tile_parameters.grid_size,
+            'zoom_level': self.zoom_level,
+            'scrollable': self.view_state.scrollable,
+            'view_size': self.view_state.view_size,
+            'total_size': self.view_state.total_size,
+        })
+
+    @profiled('scan_plan')
+    def _plan_streaming_scan(self) -> ScanPlan:
+        first_im = self._puzzle_box_screenshot()
+        borders = self._find_puzzle_borders(first_im)
+        scrollable = (
+            borders[0] < 5 or borders[2] > first_im.size[0] - 5,
+            borders[1] < 5 or borders[3] > first_im.size[1] - 5,
+        )
+        self.view_state.scrollable = scrollable
+        self.view_state.view_size = first_im.size
+        scroll_amount = (int(self.tile_parameters.tile_size[0] * 4), int(self.tile_parameters.tile_size[1] * 4))
+
+        # Make sure we start at the very end
+        prev_im = self._scroll_to_origin(first_im, scrollable)
+
+        # Only the edges are probed here, the top left frame is at the origin of the full puzzle image
+        self.tile_parameters = self._measure_grid_size(prev_im, self._estimate_tile_parameters(prev_im))
+        borders = self._find_puzzle_borders(prev_im)
+        full_borders = list(borders)
+        frames = [1, 1]
+        last_offset = [0, 0]
+        for axis in range(2):
+            if not scrollable[axis]:
+                continue
+            delta = (-scroll_amount[0], 0) if axis == 0 else (0, -scroll_amount[1])
+            im = prev_im
+            for _ in range(50):
+                self._scroll_view(borders, delta[0], delta[1])
+                im = self._puzzle_box_screenshot()
+                frames[axis] += 1
+                borders = self._find_puzzle_borders(im)
+                if borders[axis + 2] < im.size[axis] - 5:
+                    break
+                prev_im = im
+            last_offset[axis] = self._determine_image_offset(
+                prev_im, im, (-delta[0], -delta[1]), (1, 0) if axis == 0 else (0, 1))[axis]
+            full_borders[axis + 2] = borders[axis + 2] + (frames[axis] - 2) * scroll_amount[axis] + last_offset[axis]
+            prev_im = im
+
+        # Reset to the top left frame
+        for axis in reversed(range(2)):
+            for _ in range(frames[axis] - 1):
+                self._scroll_view(borders, scroll_amount[0] if axis == 0 else 0, scroll_amount[1] if axis == 1 else 0)
+
+        plan = ScanPlan((frames[0], frames[1]), scroll_amount, (last_offset[0], last_offset[1]),
+                        (full_borders[0], full_borders[1], full_borders[2], full_borders[3]))
+        last_frame = plan.frame_offset(frames[0] - 1, frames[1] - 1)
+        self.view_state.total_size = (first_im.size[0] + last_frame[0], first_im.size[1] + last_frame[1])
+        return plan
 
-        count_x = _count_tiles(1, 0)
-        count_y = _count_tiles(0, 1)
-        return count_x, count_y
+    @profiled('stream')
+    def _stream_puzzle(self, plan: ScanPlan, confirm_read: bool) -> None:
+        self.tile_configurations = array('b', [-1]) * (self.puzzle_size[0] * self.puzzle_size[1])
+        self.tile_locked = array('b', [0]) * (self.puzzle_size[0] * self.puzzle_size[1])
+        scale = self.mosaic_scale or (MOSAIC_DEBUG_SCALE if confirm_read else 0)
+        self.mosaic = None
+        if scale:
+            self.mosaic = Image.new("RGB", (int(self.view_state.total_size[0] * scale),
+                                            int(self.view_state.total_size[1] * scale)))
+
+        # A single worker keeps the writes to the configuration array and the mosaic ordered
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            decoded = deque()
+            for row in range(plan.frames[1]):
+                for column in range(plan.frames[0]):
+                    if column > 0:
+                        self._scroll_view(self._frame_borders(plan, column - 1, row), -plan.scroll_amount[0], 0)
+                    # Bound the number of screenshots waiting to be decoded
+                    while len(decoded) >= ANALYSIS_WORKERS:
+                        decoded.popleft().result()
+                    decoded.append(pool.submit(self._decode_screenshot, self.ui.get_screenshot(),
+                                               plan.frame_offset(column, row), confirm_read, scale))
+                # Reset horizontal position
+                for column in reversed(range(1, plan.frames[0])):
+                    self._scroll_view(self._frame_borders(plan, column, row), plan.scroll_amount[0], 0)
+                if row < plan.frames[1] - 1:
+                    self._scroll_view(self._frame_borders(plan, 0, row), 0, -plan.scroll_amount[1])
+            # Reset vertical position
+            for row in reversed(range(1, plan.frames[1])):
+                self._scroll_view(self._frame_borders(plan, 0, row), 0, plan.scroll_amount[1])
+            for future in decoded:
+                future.result()
+
+        for index, configuration in enumerate(self.tile_configurations):
+            if configuration == -1:
+                raise Exception(f"Tile at {index % self.puzzle_size[0]}/{index // self.puzzle_size[0]} "
+                                f"was not covered by any screenshot")
+
+    @profiled('decode_frame')
+    def _decode_screenshot(self, screenshot: Image, origin: Tuple[int, int], confirm_read: bool,
+                           scale: float) -> None:
+        im = screenshot.crop(self.puzzle_box)
+        self._decode_frame(im, origin, confirm_read)
+        if self.mosaic is not None:
+            self.mosaic.paste(im.resize((int(im.size[0] * scale), int(im.size[1] * scale))),
+                              (int(origin[0] * scale), int(origin[1] * scale)))
+
+    def _decode_frame(self, im: Image, origin: Tuple[int, int], confirm_read: bool) -> None:
+        margin = int(self._sample_radius()) + 6
+        grid_size = self.tile_parameters.grid_size
+        first_tile_offset = self.tile_parameters.first_tile_offset
+        min_y = max(0, int((origin[1] - first_tile_offset[1]) // grid_size[1]))
+        max_y = min(self.puzzle_size[1] - 1, int((origin[1] + im.size[1] - first_tile_offset[1]) // grid_size[1]))
+        min_x = max(0, int((origin[0] - first_tile_offset[0]) // grid_size[0]) - 1)
+        max_x = min(self.puzzle_size[0] - 1, int((origin[0] + im.size[0] - first_tile_offset[0]) // grid_size[0]))
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+                index = y * self.puzzle_size[0] + x
+                if self.tile_configurations[index] != -1:
+                    continue
+                center = self._get_tile_center(x, y)
+                if origin[0] + margin <= center[0] < origin[0] + im.size[0] - margin and \
+                        origin[1] + margin <= center[1] < origin[1] + im.size[1] - margin:
+                    self.tile_configurations[index] = self._decode_tile(im, x, y, origin, confirm_read)
+                    self.tile_locked[index] = self._is_tile_locked(im, x, y, origin)
+
+    def _frame_borders(self, plan: ScanPlan, column: int, row: int) -> Tuple[int, int, int, int]:
+        origin = plan.frame_offset(column, row)
+        size = self.view_state.view_size
+        return (max(0, plan.borders[0] - origin[0]), max(0, plan.borders[1] - origin[1]),
+                min(size[0] - 1, plan.borders[2] - origin[0]), min(size[1] - 1, plan.borders[3] - origin[1]))
+
+    @profiled('scroll_to_origin')
+    def _scroll_to_origin(self, im: Image, scrollable: Tuple[bool, bool]) -> Image:
+        # The view might have been left anywhere by a previous puzzle
+        for _ in range(50):
+            borders = self._find_puzzle_borders(im)
+            step = self._pan_step()
+            diff = (-step[0] if scrollable[0] and borders[0] < 5 else 0,
+                    -step[1] if scrollable[1] and borders[1] < 5 else 0)
+            if diff == (0, 0):
+                break
+            self._drag_view_by(diff, step)
+            previous_im = im
+            im = self._puzzle_box_screenshot()
+            # Puzzles without a margin never show the border, but stop moving at the end
+            if ImageChops.difference(previous_im, im).getbbox() is None:
+                break
+        # Scans always return to this position
+        self.view_state.view_offset = (0, 0)
+        if self.verify_pans:
+            im = self._measure_pan_ratio(im, scrollable)
+        return im
+
+    def _measure_pan_ratio(self, im: Image, scrollable: Tuple[bool, bool]) -> Image:
+        # Scans drag by whole frames and expect the view to follow exactly, so the ratio is measured up front
+        for axis in range(2):
+            if not scrollable[axis]:
+                continue
+            step = [0, 0]
+            step[axis] = self._pan_step()[axis]
+            mouse_delta = self._drag_view_by((step[0], step[1]), self._pan_step())
+            moved_im = self._puzzle_box_screenshot()
+            moved = self._measure_pan(im, moved_im, (step[0], step[1]), PAN_RATIO_ERROR)
+            # Views that reach their end during the drag move less than the mouse, their ratio stays as it is
+            if moved[axis] and self._find_puzzle_borders(moved_im)[axis + 2] >= moved_im.size[axis] - 5:
+                self.pan_ratio[axis] = moved[axis] / -mouse_delta[axis]
+            # Dragging back further than needed stops at the origin
+            back = [0, 0]
+            back[axis] = -moved[axis] - PAN_EDGE_MARGIN
+            self._drag_view_by((back[0], back[1]), self._pan_step())
+        return self._puzzle_box_screenshot() if any(scrollable) else im
+
+    @profiled('scroll')
+    def _scroll_view(self, borders: Tuple[int, int, int, int], dx: int, dy: int) -> None:
+        def _start(low: int, high: int, delta: int) -> int:
+            if delta > 0:
+                return low + 50
+            if delta < 0:
+                return high - 50
+            return (low + high) // 2
+
+        # Scans move the view by the given amount, the mouse has to travel further when the view lags behind
+        self.ui.mouse_drag(
+            self.puzzle_box[0] + _start(borders[0], borders[2], dx),
+            self.puzzle_box[1] + _start(borders[1], borders[3], dy),
+            int(round(dx / self.pan_ratio[0])), int(round(dy / self.pan_ratio[1])))
+
+    def _puzzle_box_screenshot(self) -> Image:
+        return self.ui.get_screenshot().crop(self.puzzle_box)
 
     def _is_pipe_color(self, im: Image, x: int, y: int, radius: int, color: bool = False) -> bool:
         count = 0
@@ -245,6 +743,7 @@ class HexagonalBridge(Bridge):
                         im.putpixel((xx, yy), (255, 0, 0))
         return count >= radius
 
+    @profiled('stitch')
     def _take_complete_screenshot(self):
         first_im = self._puzzle_box_screenshot()
         borders = self._find_puzzle_borders(first_im)
@@ -266,72 +765,58 @@ class HexagonalBridge(Bridge):
         scroll_amount_y = int(self.tile_parameters.tile_size[1] * 4)
 
         # Make sure we start at the very end
-        if scrollable[0]:
-            self.ui.mouse_drag(
-                self.puzzle_box[0] + borders[0] + 50,
-                self.puzzle_box[1] + (borders[1] + borders[3]) // 2,
-                scroll_amount_x, 0)
-        if scrollable[1]:
-            self.ui.mouse_drag(
-                self.puzzle_box[0] + (borders[0] + borders[2]) // 2,
-                self.puzzle_box[1] + borders[1] + 50,
-                0, scroll_amount_y)
-
-        def _horizontal_scan():
-            initial_image = self._puzzle_box_screenshot()
-            if not scrollable[0]:
-                return [initial_image]
-            images = [initial_image]
-            borders = self._find_puzzle_borders(initial_image)
-            # Take screenshots until we find the border
-            for _ in range(50):
-                self.ui.mouse_drag(
-                    self.puzzle_box[0] + borders[2] - 50,
-                    self.puzzle_box[1] + (borders[1] + borders[3]) // 2,
-                    -scroll_amount_x, 0)
-                # The UI needs some time to redraw
-                time.sleep(0.2)
-                im = self._puzzle_box_screenshot()
-                images.append(im)
-                borders = self._find_puzzle_borders(im)
-                if borders[2] < im.size[0] - 5:
-                    break
-            # Reset horizontal position
-            for _ in range(len(images) - 1):
-                self.ui.mouse_drag(
-                    self.puzzle_box[0] + borders[0] + 50,
-                    self.puzzle_box[1] + (borders[1] + borders[3]) // 2,
-                    scroll_amount_x, 0)
-            # The UI needs some time to redraw
-            time.sleep(0.2)
-            return images
-
-        images = [_horizontal_scan()]
-        if scrollable[1]:
-            # Take screenshots until we find the border
-            for _ in range(50):
-                self.ui.mouse_drag(
-                    self.puzzle_box[0] + (borders[0] + borders[2]) // 2,
-                    self.puzzle_box[1] + borders[3] - 50,
-                    0, -scroll_amount_y)
-                # The UI needs some time to redraw
-                time.sleep(0.2)
-                images.append(_horizontal_scan())
-                im = self._puzzle_box_screenshot()
-                borders = self._find_puzzle_borders(im)
-                if borders[3] < im.size[1] - 5:
-                    break
-            # Reset vertical position
-            for _ in range(len(images) - 1):
-                self.ui.mouse_drag(
-                    self.puzzle_box[0] + (borders[0] + borders[2]) // 2,
-                    self.puzzle_box[1] + borders[1] + 50,
-                    0, scroll_amount_y)
+        self._scroll_to_origin(first_im, scrollable)
+
+        with ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS) as pool:
+            def _analyze_frame(screenshot: Image) -> Tuple[Image, Tuple[int, int, int, int]]:
+                im = screenshot.crop(self.puzzle_box)
+                return im, self._find_puzzle_borders(im)
+
+            def _capture_frame() -> Future:
+                # Only the border check waits for the analysis, the offsets are registered in the background
+                return pool.submit(_analyze_frame, self.ui.get_screenshot())
+
+            def _horizontal_scan() -> List[Future]:
+                frames = [_capture_frame()]
+                if not scrollable[0]:
+                    return frames
+                # Take screenshots until we find the border
+                for _ in range(50):
+                    im, drag_borders = frames[-1].result()
+                    if drag_borders[2] < im.size[0] - 5:
+                        break
+                    self._scroll_view(drag_borders, -scroll_amount_x, 0)
+                    frames.append(_capture_frame())
+                # Reset horizontal position
+                for _ in range(len(frames) - 1):
+                    self._scroll_view(drag_borders, scroll_amount_x, 0)
+                return frames
 
-        last_offset_x = self._determine_image_offset(images[0][-2], images[0][-1], (scroll_amount_x, 0), (1, 0))[0] \
-            if scrollable[0] else 0
-        last_offset_y = self._determine_image_offset(images[-2][0], images[-1][0], (0, scroll_amount_y), (0, 1))[1] \
-            if scrollable[1] else 0
+            def _register(reference: Future, offset: Future, expected: Tuple[int, int],
+                          delta: Tuple[int, int]) -> Tuple[int, int]:
+                return self._determine_image_offset(reference.result()[0], offset.result()[0], expected, delta)
+
+            frames = [_horizontal_scan()]
+            last_offset_x = pool.submit(_register, frames[0][-2], frames[0][-1], (scroll_amount_x, 0), (1, 0)) \
+                if scrollable[0] else None
+            if scrollable[1]:
+                # Take screenshots until we find the border
+                for _ in range(50):
+                    # The first frame of the previous row was taken at the current position
+                    im, borders = frames[-1][0].result()
+                    if borders[3] < im.size[1] - 5:
+                        break
+                    self._scroll_view(borders, 0, -scroll_amount_y)
+                    frames.append(_horizontal_scan())
+                # Reset vertical position
+                for _ in range(len(frames) - 1):
+                    self._scroll_view(borders, 0, scroll_amount_y)
+            last_offset_y = pool.submit(_register, frames[-2][0], frames[-1][0], (0, scroll_amount_y), (0, 1)) \
+                if scrollable[1] else None
+
+            images = [[frame.result()[0] for frame in row] for row in frames]
+            last_offset_x = last_offset_x.result()[0] if last_offset_x else 0
+            last_offset_y = last_offset_y.result()[1] if last_offset_y else 0
 
         full_im = Image.new(first_im.mode, (
             first_im.size[0] + ((scroll_amount_x * (len(images[0]) - 2) + last_offset_x) if scrollable[0] else 0),
@@ -355,23 +840,33 @@ class HexagonalBridge(Bridge):
         cur_x = expected[0]
         cur_y = expected[1]
 
-        def _get_diff():
+        def _get_diff() -> Optional[float]:
+            # Views that moved by more than half their size only overlap in part of the samples
+            xs = [x for x in range(reference.size[0] // 2, reference.size[0], 50) if 0 <= x - cur_x < offset.size[0]]
+            ys = [y for y in range(reference.size[1] // 2, reference.size[1], 50) if 0 <= y - cur_y < offset.size[1]]
+            if not xs or not ys:
+                return None
             sol = 0
-            for y in range(reference.size[1] // 2, reference.size[1], 50):
-                for x in range(reference.size[0] // 2, reference.size[0], 50):
+            for y in ys:
+                for x in xs:
                     sol += color_dist_sq(reference.getpixel((x, y)), offset.getpixel((x - cur_x, y - cur_y)))
-            return sol
+            return sol / (len(xs) * len(ys))
 
         miv = 0x3fffffff
-        mi = (0, 0)
+        mi = []
         for _ in range(expected[0] + expected[1]):
             diff = _get_diff()
-            if diff < miv:
-                mi = (cur_x, cur_y)
+            if diff is not None and diff < miv:
+                mi = [(cur_x, cur_y)]
                 miv = diff
+            elif diff is not None and diff == miv:
+                mi.append((cur_x, cur_y))
             cur_x -= delta[0]
             cur_y -= delta[1]
-        return mi
+        if not mi:
+            raise Exception(f"Unable to find the offset between screenshots, expected {expected}")
+        # The samples can not tell apart offsets a pixel apart, which made the view one pixel larger than it scrolls
+        return min(mi, key=lambda c: _overlap_difference(reference, offset, c[0], c[1]))
 
     def _find_puzzle_borders(self, im: Image) -> Tuple[int, int, int, int]:
         def _find_horizontal(y: int, dy: int):
@@ -406,6 +901,7 @@ class HexagonalBridge(Bridge):
         right = _find_vertical(im.size[0] - 1, -1)
         return left, top, right, bottom
 
+    @profiled('zoom')
     def _zoom_puzzle(self) -> None:
         for _ in range(10):
             im = self._puzzle_box_screenshot()
@@ -418,14 +914,12 @@ class HexagonalBridge(Bridge):
                 return
             borders = self._find_puzzle_borders(im)
             self.ui.mouse_click(self.puzzle_box[0] + borders[0] + 10, self.puzzle_box[1] + borders[1] + 10, 4)
+            self.zoom_level += 1
         raise Exception("Unable to zoom to recognize puzzle")
 
     def _determine_tile_parameters(self, im: Image, puzzle_size: Tuple[int, int],
                                    estimated_parameters: TileParameters) -> TileParameters:
         borders = self._find_puzzle_borders(im)
-        grid_width = (borders[2] - borders[0]) / (puzzle_size[0] + 0.5)
-        grid_height = (borders[3] - borders[1] -
-                       (estimated_parameters.tile_size[1] - estimated_parameters.grid_size[1])) / (puzzle_size[1])
 
         for i in range(200):
             im.putpixel((borders[0], im.size[1] // 2 - 100 + i), (0, 0, 255))
@@ -433,6 +927,22 @@ class HexagonalBridge(Bridge):
             im.putpixel((im.size[0] // 2 - 100 + i, borders[1]), (0, 0, 255))
             im.putpixel((im.size[0] // 2 - 100 + i, borders[3]), (0, 0, 255))
 
+        return self._grid_from_borders(borders, puzzle_size, estimated_parameters)
+
+    def _puzzle_size_from_borders(self, borders: Tuple[int, int, int, int],
+                                  estimated_parameters: TileParameters) -> Tuple[int, int]:
+        return (
+            round((borders[2] - borders[0]) / estimated_parameters.grid_size[0] - 0.5),
+            round((borders[3] - borders[1] - (estimated_parameters.tile_size[1] - estimated_parameters.grid_size[1]))
+                  / estimated_parameters.grid_size[1]),
+        )
+
+    def _grid_from_borders(self, borders: Tuple[int, int, int, int], puzzle_size: Tuple[int, int],
+                           estimated_parameters: TileParameters) -> TileParameters:
+        grid_width = (borders[2] - borders[0]) / (puzzle_size[0] + 0.5)
+        grid_height = (borders[3] - borders[1] -
+                       (estimated_parameters.tile_size[1] - estimated_parameters.grid_size[1])) / (puzzle_size[1])
+
         return TileParameters(
             estimated_parameters.tile_size,
             estimated_parameters.first_tile_offset,
@@ -463,9 +973,13 @@ class HexagonalBridge(Bridge):
         tile_height = _get_tile_size(0, 1)
 
         row_height = tile_height // 2
-        while color_dist_sq(
-                im.getpixel((first_border_offset[0] + tile_width // 2, first_border_offset[1] + row_height)),
-                TILE_BACKGROUND) > TILE_BACKGROUND_MARGIN:
+
+        def _is_tile_background(pixel: Tuple[int, int, int]) -> bool:
+            return color_dist_sq(pixel, TILE_BACKGROUND) <= TILE_BACKGROUND_MARGIN or \
+                color_dist_sq(pixel, TILE_LOCKED_BACKGROUND) <= TILE_BACKGROUND_MARGIN
+
+        while not _is_tile_background(
+                im.getpixel((first_border_offset[0] + tile_width // 2, first_border_offset[1] + row_height))):
             row_height += 1
         row_height -= 2
 
@@ -475,6 +989,46 @@ class HexagonalBridge(Bridge):
             (tile_width, row_height)
         )
 
+    def _measure_grid_size(self, im: Image, estimated_parameters: TileParameters) -> TileParameters:
+        # The estimated grid size is rounded to full pixels, which adds up to more than a tile on large boards.
+        # Averaging over all tile edges visible in the frame is precise enough to count the tiles.
+        def _edges(x: int, y: int, dx: int, dy: int) -> List[int]:
+            edges = []
+            previous = False
+            while 0 <= x < im.size[0] and 0 <= y < im.size[1]:
+                border = color_dist_sq(im.getpixel((x, y)), TILE_BORDER) <= TILE_BORDER_MARGIN
+                if border and not previous:
+                    edges.append(x * dx + y * dy)
+                previous = border
+                x += dx
+                y += dy
+            # The outline of the puzzle is only drawn by a single tile, which shifts it
+            return edges[1:-1]
+
+        def _pitch(edges: List[int], period: int, estimate: float) -> float:
+            # Only edges at the same position within the tile are compared
+            count = (len(edges) - 1) // period
+            if count < 1:
+                return estimate
+            # A missed or an extra edge shows up as a step far off the estimate. The whole span can not be checked
+            # against the estimate, its rounding adds up to more than a tile on large boards.
+            if any(abs(edges[(i + 1) * period] - edges[i * period] - estimate * period) > estimate * period / 4
+                   for i in range(count)):
+                return estimate
+            return (edges[count * period] - edges[0]) / (count * period)
+
+        center = estimated_parameters.first_tile_offset
+        tile_size = estimated_parameters.tile_size
+        grid_size = estimated_parameters.grid_size
+        # Stay clear of the pipes, the vertical line crosses differently shaped edges in even and odd rows
+        grid_width = _pitch(_edges(center[0], center[1] + tile_size[1] // 8, 1, 0), 1, grid_size[0])
+        # Slanted edges are rounded differently in every column, so average over all of them
+        first_x = center[0] + tile_size[0] / 8
+        heights = [_pitch(_edges(int(first_x + column * grid_width), 0, 0, 1), 2, grid_size[1])
+                   for column in range(int((im.size[0] - first_x) / grid_width) + 1)]
+        grid_height = sum(heights) / len(heights)
+        return TileParameters(tile_size, center, (grid_width, grid_height))
+
     def _scroll_puzzle_box_into_view(self) -> None:
         for _ in range(100):
             im = self.ui.get_screenshot()
@@ -484,6 +1038,16 @@ class HexagonalBridge(Bridge):
             self.ui.key_press("Down")
         raise Exception("Did not find complete puzzle box")
 
+    def _is_puzzle_box(self, im: Image, puzzle_box: Tuple[int, int, int, int]) -> bool:
+        if puzzle_box[2] >= im.size[0] or puzzle_box[3] > im.size[1]:
+            return False
+        mid_x = (puzzle_box[0] + puzzle_box[2]) // 2
+        mid_y = (puzzle_box[1] + puzzle_box[3]) // 2
+        for point in ((mid_x, puzzle_box[1]), (puzzle_box[0], mid_y), (puzzle_box[2], mid_y)):
+            if color_dist_sq(im.getpixel(point), PUZZLE_BOX_BORDER) > PUZZLE_BOX_BORDER_MARGIN:
+                return False
+        return True
+
     def _find_puzzle_box(self, im: Image) -> Tuple[int, int, int, int]:
         mid_x = im.size[0] // 2
 
@@ -0,0 +1,162 @@
+from typing import List, Tuple, Dict, Callable
+
+
+class TileAction:
+    x: int
+    y: int
+    center: Tuple[int, int]
+    rotations: int
+    ctrl: bool
+    lock: bool
+    unlock: bool
+
+    def __init__(self, x: int, y: int, center: Tuple[int, int], rotations: int, ctrl: bool, lock: bool,
+                 unlock: bool = False):
+        self.x = x
+        self.y = y
+        self.center = center
+        self.rotations = rotations
+        self.ctrl = ctrl
+        self.lock = lock
+        self.unlock = unlock
+
+    def clicks(self) -> int:
+        return self.rotations + (1 if self.lock else 0) + (1 if self.unlock else 0)
+
+
+class ViewWindow:
+    offset: Tuple[int, int]
+    actions: List[TileAction]
+
+    def __init__(self, offset: Tuple[int, int]):
+        self.offset = offset
+        self.actions = []
+
+
+class PlanCost:
+    windows: int
+    drags: int
+    drag_distance: int
+    clicks: int
+
+    def __init__(self, windows: int, drags: int, drag_distance: int, clicks: int):
+        self.windows = windows
+        self.drags = drags
+        self.drag_distance = drag_distance
+        self.clicks = clicks
+
+    def __repr__(self):
+        return f"PlanCost(windows={self.windows},drags={self.drags},drag_distance={self.drag_distance}," \
+               f"clicks={self.clicks})"
+
+
+class ActionPlan:
+    windows: List[ViewWindow]
+    cost: PlanCost
+
+    def __init__(self, windows: List[ViewWindow], cost: PlanCost):
+        self.windows = windows
+        self.cost = cost
+
+
+class ActionPlanner:
+    view_size: Tuple[int, int]
+    total_size: Tuple[int, int]
+    scrollable: Tuple[bool, bool]
+    margin: Tuple[int, int]
+    max_drag: Tuple[int, int]
+
+    def __init__(self, view_size: Tuple[int, int], total_size: Tuple[int, int], scrollable: Tuple[bool, bool],
+                 margin: Tuple[int, int], max_drag: Tuple[int, int]):
+        self.view_size = view_size
+        self.total_size = total_size
+        self.scrollable = scrollable
+        self.margin = margin
+        self.max_drag = max_drag
+
+    def plan(self, actions: List[TileAction], start_offset: Tuple[int, int]) -> ActionPlan:
+        step = tuple(max(1, self.view_size[i] - 2 * self.margin[i]) for i in range(2))
+        windows: Dict[Tuple[int, int], ViewWindow] = {}
+        for action in actions:
+            index = tuple(max(0, (action.center[i] - self.margin[i]) // step[i]) if self.scrollable[i] else 0
+                          for i in range(2))
+            if index not in windows:
+                windows[index] = ViewWindow(tuple(self._clamp_offset(index[i] * step[i], i) for i in range(2)))
+            windows[index].actions.append(action)
+
+        def _serpentine(flip_x: bool, flip_y: bool, transpose: bool) -> Callable[[Tuple[int, int]], Tuple]:
+            def _key(index: Tuple[int, int]) -> Tuple:
+                x = -index[0] if flip_x else index[0]
+                y = -index[1] if flip_y else index[1]
+                if transpose:
+                    x, y = y, x
+                return y, x if y % 2 == 0 else -x
+            return _key
+
+        candidates = [sorted(windows, key=_serpentine(flip_x, flip_y, transpose))
+                      for flip_x in (False, True) for flip_y in (False, True) for transpose in (False, True)]
+        candidates.append(self._nearest_neighbor_order(windows, start_offset))
+        best = min(candidates, key=lambda order: self._order_cost(
+            [windows[index].offset for index in order], start_offset))
+        return self._make_plan([windows[index] for index in best], start_offset)
+
+    def plan_in_order(self, actions: List[TileAction], start_offset: Tuple[int, int]) -> ActionPlan:
+        # Keep the given order and only pan when the next tile is not comfortably in view
+        ordered_windows = []
+        offset = start_offset
+        for action in actions:
+            target = tuple(self._recenter(action.center[i], offset[i], i) for i in range(2))
+            if not ordered_windows or target != offset:
+                offset = target
+                ordered_windows.append(ViewWindow(offset))
+            ordered_windows[-1].actions.append(action)
+        return self._make_plan(ordered_windows, start_offset)
+
+    def pan_cost(self, start: Tuple[int, int], end: Tuple[int, int]) -> Tuple[int, int]:
+        # Both axes move with the same diagonal drags
+        drags = 0
+        distance = 0
+        for i in range(2):
+            diff = abs(end[i] - start[i])
+            drags = max(drags, -(-diff // self.max_drag[i]))
+            distance += diff
+        return drags, distance
+
+    def _make_plan(self, windows: List[ViewWindow], start_offset: Tuple[int, int]) -> ActionPlan:
+        drags, distance = self._order_cost([window.offset for window in windows], start_offset)
+        clicks = sum(action.clicks() for window in windows for action in window.actions)
+        return ActionPlan(windows, PlanCost(len(windows), drags, distance, clicks))
+
+    def _order_cost(self, offsets: List[Tuple[int, int]], start_offset: Tuple[int, int]) -> Tuple[int, int]:
+        drags = 0
+        distance = 0
+        for offset in offsets:
+            cost = self.pan_cost(start_offset, offset)
+            drags += cost[0]
+            distance += cost[1]
+            start_offset = offset
+        return drags, distance
+
+    def _nearest_neighbor_order(self, windows: Dict[Tuple[int, int], ViewWindow],
+                                start_offset: Tuple[int, int]) -> List[Tuple[int, int]]:
+        remaining = set(windows)
+        order = []
+        offset = start_offset
+        while remaining:
+            index = min(remaining, key=lambda i: (self.pan_cost(offset, windows[i].offset), i))
+            remaining.remove(index)
+            order.append(index)
+            offset = windows[index].offset
+        return order
+
+    def _recenter(self, target: int, offset: int, axis: int) -> int:
+        if not self.scrollable[axis]:
+            return offset
+        if target - self.margin[axis] < offset or target + self.margin[axis] > offset + self.view_size[axis]:
+            return self._clamp_offset(target - self.view_size[axis] // 2, axis)
+        return offset
+
+    def _clamp_offset(self, offset: int, axis: int) -> int:
+        if not self.scrollable[axis]:
+            return 0
+        return max(0, min(self.total_size[axis] - self.view_size[axis], offset))
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from calibration import CalibrationCache
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+
+def _read(path, seed, window_size=(1280, 900), view_box=(40, 120, 1240, 860), entry_edit=None):
+    if entry_edit is not None:
+        with open(path) as f:
+            entries = json.load(f)
+        for entry in entries.values():
+            entry_edit(entry)
+        with open(path, 'w') as f:
+            json.dump(entries, f)
+    puzzle = SyntheticPuzzle.generate(12, 10, seed)[0]
+    ui = SyntheticUI(puzzle, window_size, view_box)
+    manager = PuzzleManager(ui.window_name, 'hexagonal', calibration_cache=path, ui=ui)
+    manager.read_puzzle()
+    assert [tile.initial_configuration for tile in manager.puzzle.tiles] == puzzle.configurations
+
+
+def _move_box(entry):
+    entry['puzzle_box'] = [value + 40 for value in entry['puzzle_box']]
+
+
+def _grow_tiles(entry):
+    entry['tile_size'] = [value * 2 for value in entry['tile_size']]
+
+
+def test_cache_entries_survive_a_new_process(tmp_path):
+    path = str(tmp_path / 'cache' / 'calibration.json')
+    entry = {'puzzle_box': [1, 2, 3, 4], 'zoom_level': 2}
+    CalibrationCache(path, 'hexagonal').store('1', (800, 600), entry)
+
+    cache = CalibrationCache(path, 'hexagonal')
+    assert cache.load('1', (800, 600)) == entry
+    assert cache.load('1', (800, 601)) is None
+    assert cache.load('2', (800, 600)) is None
+    assert CalibrationCache(path, 'square').load('1', (800, 600)) is None
+
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    path = tmp_path / 'calibration.json'
+    path.write_text('{"hexagonal/1/800x600": ')
+    cache = CalibrationCache(str(path), 'hexagonal')
+
+    assert cache.load('1', (800, 600)) is None
+    cache.store('1', (800, 600), {'zoom_level': 0})
+    assert CalibrationCache(str(path), 'hexagonal').load('1', (800, 600)) == {'zoom_level': 0}
+
+
+def test_stored_calibration_is_restored(tmp_path, capsys):
+    path = str(tmp_path / 'calibration.json')
+    _read(path, 0)
+    assert "Calibrating view" in capsys.readouterr().out
+
+    _read(path, 1)
+    output = capsys.readouterr().out
+    assert "Reusing calibration" in output
+    assert "Calibrating view" not in output
+
+
+def test_calibration_falls_back_when_the_window_size_changed(tmp_path, capsys):
+    path = str(tmp_path / 'calibration.json')
+    _read(path, 0)
+    capsys.readouterr()
+
+    _read(path, 1, window_size=(1200, 900), view_box=(40, 120, 1160, 860))
+    output = capsys.readouterr().out
+    assert "Reusing calibration" not in output
+    assert "Calibrating view" in output
+
+
+@pytest.mark.parametrize('entry_edit', [_move_box, _grow_tiles])
+def test_calibration_falls_back_when_the_cached_entry_does_not_fit(tmp_path, capsys, entry_edit):
+    path = str(tmp_path / 'calibration.json')
+    _read(path, 0)
+    capsys.readouterr()
+
+    _read(path, 1, entry_edit=entry_edit)
+    output = capsys.readouterr().out
+    assert "Reusing calibration" not in output
+    assert "Calibrating view" in output
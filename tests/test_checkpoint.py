@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from checkpoint import Checkpoint
+from manager import PuzzleManager
+from registry import SOLVERS
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'bt1.json')
+
+
+@pytest.mark.parametrize('solver', sorted(SOLVERS.builtins))
+def test_every_solver_writes_a_checkpoint(solver, tmp_path):
+    path = str(tmp_path / 'checkpoint')
+    manager = PuzzleManager('', 'hexagonal', checkpoint=path)
+    manager.load_puzzle(EXAMPLE)
+    manager.solve_puzzle(solver)
+
+    restored = Checkpoint.load(path)
+    assert [tile.initial_configuration for tile in restored.tiles] == \
+           [tile.initial_configuration for tile in manager.puzzle.tiles]
+    assert [tile.possible_configurations for tile in restored.tiles] == \
+           [tile.possible_configurations for tile in manager.puzzle.tiles]
+    assert [tile.solve_order for tile in restored.tiles] == [tile.solve_order for tile in manager.puzzle.tiles]
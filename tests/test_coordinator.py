@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from coordinator import Coordinator, InputScheduler, ScheduledUI
+from manager import PuzzleManager
+from registry import SOLVERS
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'bt1.json')
+WINDOWS = 2
+PUZZLES_PER_WINDOW = 2
+
+
+def test_coordinator_handles_every_puzzle_of_every_window():
+    scheduler = InputScheduler()
+    managers = []
+    upcoming = {}
+    for window in range(WINDOWS):
+        puzzles = [SyntheticPuzzle.generate(12, 10, window * PUZZLES_PER_WINDOW + index)[0]
+                   for index in range(PUZZLES_PER_WINDOW)]
+        ui = SyntheticUI(puzzles[0])
+        ui.window_name = f"Synthetic {window}"
+        ui.wid = str(window)
+        managers.append(PuzzleManager(ui.window_name, 'hexagonal', ui=ScheduledUI(ui, scheduler)))
+        upcoming[ui.window_name] = (ui, puzzles[1:])
+    solved_in_window = []
+
+    def _handle_puzzle(manager: PuzzleManager) -> None:
+        manager.read_puzzle()
+        manager.solve_puzzle('bt')
+        manager.apply_puzzle(False)
+        ui, puzzles = upcoming[manager.window_name]
+        solved_in_window.append(ui.puzzle.is_solved())
+        if puzzles:
+            ui.show_puzzle_after(puzzles.pop(0))
+
+    coordinator = Coordinator(managers, scheduler)
+    assert coordinator.run(_handle_puzzle, poll_interval=0, max_puzzles=PUZZLES_PER_WINDOW) == \
+           (WINDOWS * PUZZLES_PER_WINDOW, WINDOWS * PUZZLES_PER_WINDOW)
+    assert not coordinator.stopped
+    assert solved_in_window == [True] * (WINDOWS * PUZZLES_PER_WINDOW)
+
+
+def test_solving_with_a_pool_runs_the_solver_in_another_process(monkeypatch):
+    class _LocalSolver:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("Solved in the process of the window")
+
+    # The registry of the other process still loads the real solver
+    monkeypatch.setitem(SOLVERS.loaded, 'bt', _LocalSolver)
+    manager = PuzzleManager('offline', 'hexagonal')
+    manager.load_puzzle(EXAMPLE)
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        manager.solve_pool = pool
+        manager.solve_puzzle('bt')
+
+    assert manager.puzzle.is_solved()
+    assert all(tile.solve_order >= 0 for tile in manager.puzzle.tiles)
+
+
+def test_scheduled_ui_keeps_the_window_state_with_the_wrapped_ui():
+    ui = SyntheticUI(SyntheticPuzzle.generate(4, 3, 0)[0])
+    scheduled = ScheduledUI(ui, InputScheduler())
+    scheduled.stable_region = (1, 2, 3, 4)
+    scheduled.wait_until_stable()
+
+    assert (scheduled.window_name, ui.stable_region, ui.settle_stats.count) == (ui.window_name, (1, 2, 3, 4), 1)
+    assert scheduled.settle_stats is ui.settle_stats
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from puzzle import Puzzle
+from solver.counter import SolutionCounter
+from topology import get_topology
+from util import is_connection, rotate_configuration
+
+LIMITS = [1, 2, 3, 1000]
+
+
+def _scrambled_puzzle(topology, solution, seed):
+    rng = random.Random(seed)
+    return Puzzle.from_topology(topology, [rotate_configuration(configuration, rng.randrange(count), count)
+                                           for configuration, count in zip(solution, topology.side_counts)])
+
+
+def _random_puzzle(kind, width, height, seed):
+    topology = get_topology(kind, width, height)
+    return _scrambled_puzzle(topology, topology.random_tree(random.Random(seed)), seed)
+
+
+def _doubled_puzzle(width, height, seed):
+    # Two copies of the same board joined by a single pipe, so every ambiguous region shows up twice
+    topology = get_topology('square', 2 * width, height)
+    solution = get_topology('square', width, height).random_tree(random.Random(seed))
+    doubled = [solution[index // (2 * width) * width + index % width] for index in range(topology.tile_count())]
+    side = next(side for side in range(topology.side_counts[width - 1]) if topology.neighbor(width - 1, side) == width)
+    doubled[width - 1] |= 1 << side
+    doubled[width] |= 1 << topology.reverse_side(width - 1, side)
+    return _scrambled_puzzle(topology, doubled, seed)
+
+
+def _brute_force_count(puzzle):
+    topology = puzzle.topology
+    domains = [sorted(tile.possible_configurations) for tile in puzzle.tiles]
+    configurations = [0] * len(domains)
+
+    def _fits(index, configuration):
+        for side in range(topology.side_counts[index]):
+            neighbor = topology.neighbor(index, side)
+            connection = is_connection(configuration, side)
+            if neighbor < 0 and connection:
+                return False
+            if 0 <= neighbor < index and \
+                    connection != is_connection(configurations[neighbor], topology.reverse_side(index, side)):
+                return False
+        return True
+
+    def _is_tree():
+        parent = list(range(len(configurations)))
+
+        def _find(node):
+            while parent[node] != node:
+                node = parent[node]
+            return node
+
+        for index, configuration in enumerate(configurations):
+            for side in range(topology.side_counts[index]):
+                neighbor = topology.neighbor(index, side)
+                if neighbor > index and is_connection(configuration, side):
+                    root, neighbor_root = _find(index), _find(neighbor)
+                    if root == neighbor_root:
+                        return False
+                    parent[root] = neighbor_root
+        return len({_find(index) for index in range(len(configurations))}) == 1
+
+    def _count(index):
+        if index == len(domains):
+            return int(_is_tree())
+        count = 0
+        for configuration in domains[index]:
+            if _fits(index, configuration):
+                configurations[index] = configuration
+                count += _count(index + 1)
+        return count
+
+    return _count(0)
+
+
+@pytest.mark.parametrize('puzzle', [
+    _random_puzzle('hexagonal', 4, 3, 0),
+    # Two solutions in a region next to a single fixed network, which stops early with a limit of one
+    _random_puzzle('hexagonal', 5, 5, 270),
+    # Two regions with two solutions each
+    _random_puzzle('square', 10, 10, 8),
+])
+@pytest.mark.parametrize('limit', LIMITS)
+def test_counts_match_brute_force(puzzle, limit):
+    assert SolutionCounter(puzzle, limit).count() == min(_brute_force_count(puzzle), limit)
+
+
+@pytest.mark.parametrize('limit', LIMITS)
+def test_counts_of_identical_regions_are_shared(limit):
+    puzzle = _doubled_puzzle(5, 5, 94)
+    counter = SolutionCounter(puzzle, limit)
+
+    assert counter.count() == min(_brute_force_count(puzzle), limit)
+    assert counter.cache_hits > 0
@@ -0,0 +1,74 @@
+import pytest
+
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+from topology import get_topology
+from uibridge.hexagonal import NEIGHBORS
+from util import rotate_configuration, is_connection
+
+
+def _off_board_rotation(topology, index, configuration):
+    # A rotation of the tile that has a pipe leading off the board
+    for rotation in range(NEIGHBORS):
+        rotated = rotate_configuration(configuration, rotation, NEIGHBORS)
+        if any(is_connection(rotated, side) and topology.neighbor(index, side) < 0 for side in range(NEIGHBORS)):
+            return rotated
+    raise Exception(f"Tile {index} can not point off the board")
+
+
+def _contradicting_rotation(topology, index, side, configuration, neighbor_configuration):
+    # A rotation of the tile that disagrees with the neighbor on the given side about their shared connection
+    neighbor_connection = is_connection(neighbor_configuration, topology.reverse_side(index, side))
+    for rotation in range(NEIGHBORS):
+        rotated = rotate_configuration(configuration, rotation, NEIGHBORS)
+        if is_connection(rotated, side) != neighbor_connection:
+            return rotated
+    raise Exception(f"Tile {index} always agrees with its neighbor")
+
+
+@pytest.mark.parametrize('solver', ['logic', 'bt'])
+def test_inconsistent_locked_tiles_are_released(solver):
+    ui_puzzle, solution = SyntheticPuzzle.generate(12, 10, 0)
+    topology = get_topology('hexagonal', 12, 10)
+    # Everything is locked in its solved rotation, except for a corner pointing off the board and a pair of
+    # neighbors in the middle that do not agree on their connection
+    ui_puzzle.configurations = list(solution)
+    ui_puzzle.locked = set(range(len(solution)))
+    corner = 0
+    ui_puzzle.configurations[corner] = _off_board_rotation(topology, corner, solution[corner])
+    middle = topology.width * (topology.height // 2) + topology.width // 2
+    side = next(side for side in range(NEIGHBORS) if topology.neighbor(middle, side) >= 0)
+    neighbor = topology.neighbor(middle, side)
+    ui_puzzle.configurations[middle] = _contradicting_rotation(topology, middle, side, solution[middle],
+                                                               solution[neighbor])
+    ui = SyntheticUI(ui_puzzle)
+    manager = PuzzleManager(ui.window_name, 'hexagonal', ui=ui)
+
+    manager.read_puzzle()
+    manager.solve_puzzle(solver)
+
+    # The rotated tiles can also disagree with their other neighbors, which are released along with them
+    released = {tile.index for tile in manager.puzzle.tiles if tile.lock_released}
+    rotated = [corner, middle]
+    assert {corner, middle, neighbor} <= released
+    assert released <= set(rotated) | {topology.neighbor(index, side) for index in rotated for side in range(NEIGHBORS)}
+    assert not any(tile.locked for tile in manager.puzzle.tiles if tile.lock_released)
+    manager.apply_puzzle(False)
+    assert ui.puzzle.is_solved()
+    assert ui.puzzle.locked == set(range(len(solution)))
+
+
+@pytest.mark.parametrize('lock_unchanged', [False, True])
+def test_tiles_that_already_show_their_solution_are_only_locked_on_request(lock_unchanged):
+    ui_puzzle, solution = SyntheticPuzzle.generate(12, 10, 0)
+    unchanged = {index for index, configuration in enumerate(ui_puzzle.configurations)
+                 if configuration == solution[index]}
+    assert unchanged
+    ui = SyntheticUI(ui_puzzle)
+    manager = PuzzleManager(ui.window_name, 'hexagonal', ui=ui)
+
+    manager.read_puzzle()
+    manager.solve_puzzle('bt')
+    manager.apply_puzzle(False, lock_unchanged)
+    assert ui.puzzle.is_solved()
+    assert ui.puzzle.locked == set(range(len(solution))) - (set() if lock_unchanged else unchanged)
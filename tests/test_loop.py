@@ -0,0 +1,25 @@
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+
+def test_loop_handles_consecutive_puzzles_on_a_board_scrolling_in_one_axis(capsys):
+    # At this size the view only scrolls vertically, the apply leaves it panned down
+    puzzles = [SyntheticPuzzle.generate(12, 10, seed)[0] for seed in range(2)]
+    ui = SyntheticUI(puzzles[0])
+    manager = PuzzleManager(ui.window_name, 'hexagonal', ui=ui)
+    solved_in_window = []
+
+    def _handle_puzzle():
+        manager.read_puzzle()
+        manager.solve_puzzle('logic')
+        manager.apply_puzzle(False)
+        solved_in_window.append(ui.puzzle.is_solved())
+        if len(solved_in_window) < len(puzzles):
+            ui.show_puzzle_after(puzzles[len(solved_in_window)])
+
+    assert manager.run_loop(_handle_puzzle, poll_interval=0, max_puzzles=len(puzzles)) == (2, 2)
+    assert manager.bridge.view_state.scrollable == (False, True)
+    assert solved_in_window == [True, True]
+    # The waits for the window are summarized once at the end instead of being kept one by one
+    assert ui.settle_stats.count > 0
+    assert f"Settle: {ui.settle_stats}" in capsys.readouterr().out
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, 'examples', 'bt1.json')
+IMPORT_CHECK = '''
+import contextlib, io, sys
+sys.argv = ['main.py', '--puzzle-file', {puzzle!r}]
+import main
+with contextlib.redirect_stdout(io.StringIO()):
+    main.main()
+print(','.join(sorted(m for m in ('PIL', 'numpy', 'ui', 'uibridge.hexagonal') if m in sys.modules)))
+'''
+
+
+def test_offline_solve_imports_no_imaging_modules():
+    # A fresh interpreter, the other tests already imported everything
+    result = subprocess.run([sys.executable, '-c', IMPORT_CHECK.format(puzzle=EXAMPLE)],
+                            cwd=os.path.join(ROOT, 'src'), stdout=subprocess.PIPE, check=True)
+    assert result.stdout.decode('utf-8').strip() == ''
+
+
+@pytest.mark.parametrize('arguments', [['--solver', 'btt'], ['--puzzle-type', 'square']])
+def test_unknown_plugins_are_rejected_before_reading_the_screen(arguments, monkeypatch):
+    def _read_puzzle(*_):
+        raise AssertionError("The screen must not be read")
+
+    monkeypatch.setattr(main.PuzzleManager, 'read_puzzle', _read_puzzle)
+    monkeypatch.setattr(sys, 'argv', ['main.py'] + arguments)
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
@@ -0,0 +1,24 @@
+import pytest
+
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+
+@pytest.mark.parametrize('streaming_read', [False, True])
+def test_verified_pans_reach_the_end_of_the_view(streaming_read, capsys):
+    # The view of this board scrolls by a fraction of a pixel horizontally
+    ui = SyntheticUI(SyntheticPuzzle.generate(20, 15, 0)[0])
+    manager = PuzzleManager(ui.window_name, 'hexagonal', streaming_read, verify_pans=True, ui=ui)
+    manager.read_puzzle()
+    bridge = manager.bridge
+    view_size = ui._view_size()
+    scroll_limit = [ui.content_size()[i] - view_size[i] for i in range(2)]
+    assert [abs(bridge._max_view_offset(i) - scroll_limit[i]) <= 1 for i in range(2)] == [True, True]
+
+    for target in [(bridge._max_view_offset(0), bridge._max_view_offset(1)), (bridge._max_view_offset(0), 0)]:
+        commands = ui.commands
+        bridge._pan_view_to_offset(target)
+        # Every step is a drag with a capture before and after it, corrections would need more
+        assert ui.commands - commands <= 3 * 3
+        assert [abs(bridge.view_state.view_offset[i] - ui.pan[i]) <= 1 for i in range(2)] == [True, True]
+    assert "Could not pan view" not in capsys.readouterr().out
@@ -0,0 +1,75 @@
+import itertools
+import random
+
+import pytest
+
+from uibridge.planner import ActionPlanner, TileAction
+
+VIEW = 100
+MARGIN = 10
+STEP = VIEW - 2 * MARGIN
+
+
+def _planner():
+    return ActionPlanner((VIEW, VIEW), (1000, 1000), (True, True), (MARGIN, MARGIN), (50, 50))
+
+
+def _actions(cells):
+    return [TileAction(x, y, (MARGIN + STEP * x + STEP // 2, MARGIN + STEP * y + STEP // 2), 1, False, True)
+            for x, y in cells]
+
+
+def _serpentine_orders(cells):
+    for flip_x, flip_y, transpose in itertools.product((False, True), repeat=3):
+        def _key(cell):
+            x = -cell[0] if flip_x else cell[0]
+            y = -cell[1] if flip_y else cell[1]
+            if transpose:
+                x, y = y, x
+            return y, x if y % 2 == 0 else -x
+        yield sorted(cells, key=_key)
+
+
+def _cost(planner, cells, start_offset):
+    offsets = [tuple(planner._clamp_offset(cell[i] * STEP, i) for i in range(2)) for cell in cells]
+    return planner._order_cost(offsets, start_offset)
+
+
+def _random_cells(seed):
+    return random.Random(seed).sample([(x, y) for x in range(12) for y in range(12)], 5)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('start_offset', [(0, 0), (900, 900), (400, 0)])
+def test_plan_takes_the_cheapest_of_the_serpentine_and_nearest_neighbor_orders(seed, start_offset):
+    planner = _planner()
+    cells = _random_cells(seed)
+    plan = planner.plan(_actions(cells), start_offset)
+
+    serpentine = min(_cost(planner, order, start_offset) for order in _serpentine_orders(cells))
+    visited = [(window.actions[0].x, window.actions[0].y) for window in plan.windows]
+    assert sorted(visited) == sorted(cells)
+    assert (plan.cost.drags, plan.cost.drag_distance) == _cost(planner, visited, start_offset) <= serpentine
+    assert plan.cost.windows == len(cells)
+    assert plan.cost.clicks == 2 * len(cells)
+
+
+def test_plan_follows_the_nearest_neighbor_when_no_serpentine_is_as_cheap():
+    planner = _planner()
+    cells = [(5, 0), (11, 7), (2, 9), (7, 10), (10, 1)]
+    plan = planner.plan(_actions(cells), (0, 0))
+
+    assert [(window.actions[0].x, window.actions[0].y) for window in plan.windows] == \
+           [(5, 0), (10, 1), (11, 7), (7, 10), (2, 9)]
+    assert (plan.cost.drags, plan.cost.drag_distance) < \
+           min(_cost(planner, order, (0, 0)) for order in _serpentine_orders(cells))
+
+
+def test_plan_starts_at_the_end_closest_to_the_current_view():
+    planner = _planner()
+    cells = [(x, 3) for x in range(6)]
+
+    for start_offset, first in [((0, 240), (0, 3)), ((400, 240), (5, 3))]:
+        plan = planner.plan(_actions(cells), start_offset)
+        assert (plan.windows[0].actions[0].x, plan.windows[0].actions[0].y) == first
+        assert plan.cost.drag_distance == 5 * STEP
@@ -0,0 +1,69 @@
+import multiprocessing
+import random
+import time
+
+import pytest
+
+from manager import PuzzleManager
+from puzzle import Puzzle
+from registry import SOLVERS
+from solver.portfolio import PortfolioSolver, parse_configurations
+from topology import get_topology
+from util import rotate_configuration
+
+SLOW_SOLVER_TIME = 60
+
+
+class _SlowSolver:
+    def __init__(self, puzzle, **kwargs):
+        pass
+
+    def solve(self):
+        time.sleep(SLOW_SOLVER_TIME)
+
+
+class _BrokenSolver:
+    def __init__(self, puzzle, **kwargs):
+        pass
+
+    def solve(self):
+        raise Exception("Broken")
+
+
+def _puzzle():
+    # Small enough for the logic solver to resolve every tile
+    topology = get_topology('hexagonal', 8, 6)
+    rng = random.Random(0)
+    return Puzzle.from_topology(topology, [rotate_configuration(configuration, rng.randrange(6), 6)
+                                           for configuration in topology.random_tree(rng)])
+
+
+def test_configurations_are_parsed_with_their_options():
+    assert parse_configurations('logic, bt:depth=2:seed=1') == [('logic', {}), ('bt', {'depth': 2, 'seed': 1})]
+    with pytest.raises(Exception):
+        parse_configurations('bt:depth')
+
+
+# The workers only see the test solvers when they are forked from this process
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="Workers do not inherit the test solvers")
+def test_first_complete_solution_wins_and_stops_the_other_workers(monkeypatch):
+    monkeypatch.setitem(SOLVERS.loaded, 'slow', _SlowSolver)
+    monkeypatch.setitem(SOLVERS.loaded, 'broken', _BrokenSolver)
+    puzzle = _puzzle()
+    solver = PortfolioSolver(puzzle, 'slow,broken,logic,slow:seed=1')
+
+    start = time.perf_counter()
+    solver.solve()
+    assert time.perf_counter() - start < SLOW_SOLVER_TIME
+    assert solver.winner == 'logic'
+    assert puzzle.is_solved()
+    assert multiprocessing.active_children() == []
+
+
+def test_manager_reports_the_winner(capsys):
+    manager = PuzzleManager('offline', 'hexagonal')
+    manager.puzzle = _puzzle()
+    manager.solve_puzzle('portfolio', {'configurations': 'logic'})
+
+    assert manager.puzzle.is_solved()
+    assert "Solver winner: logic" in capsys.readouterr().out
@@ -0,0 +1,114 @@
+import threading
+
+import profiler
+from profiler import Profiler, profiled
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+def _started_profiler(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(profiler.time, 'perf_counter', clock.perf_counter)
+    profile = Profiler()
+    profile.start()
+    return profile, clock
+
+
+def _spans(profile):
+    return {span['path']: (span['count'], round(span['total'], 6), round(span['self'], 6))
+            for span in profile.report()['spans']}
+
+
+def test_nested_spans_report_their_total_and_self_time(monkeypatch):
+    profile, clock = _started_profiler(monkeypatch)
+    with profile.span('read'):
+        clock.now += 1
+        for _ in range(2):
+            with profile.span('scan'):
+                clock.now += 2
+                profile.record_command('import', 0.5)
+    with profile.span('solve'):
+        clock.now += 3
+
+    assert _spans(profile) == {
+        'read': (1, 5.0, 1.0),
+        'read;scan': (2, 4.0, 3.0),
+        'read;scan;import': (2, 1.0, 1.0),
+        'solve': (1, 3.0, 3.0),
+    }
+    assert profile.report()['wall_time'] == 8
+
+
+def test_spans_of_other_threads_are_kept_apart(monkeypatch):
+    profile, clock = _started_profiler(monkeypatch)
+
+    def _analyze():
+        with profile.span('analyze'):
+            clock.now += 1
+
+    with profile.span('read'):
+        worker = threading.Thread(target=_analyze, name='worker')
+        worker.start()
+        worker.join()
+
+    assert set(_spans(profile)) == {'read', '[worker];analyze'}
+
+
+def test_disabled_profiler_records_nothing():
+    profile = Profiler()
+    with profile.span('read'):
+        profile.count('clicks')
+        profile.record_command('import', 0.5)
+
+    report = profile.report()
+    assert (report['spans'], report['counters'], report['commands']) == ([], {}, {})
+
+
+def test_profiled_functions_run_in_a_span(monkeypatch):
+    profile, clock = _started_profiler(monkeypatch)
+    monkeypatch.setattr(profiler, 'PROFILER', profile)
+
+    @profiled('plan')
+    def _plan(amount):
+        clock.now += amount
+        return amount
+
+    assert _plan(2) == 2
+    assert _spans(profile) == {'plan': (1, 2.0, 2.0)}
+
+
+def test_command_latencies_are_summarized_in_a_histogram(monkeypatch):
+    profile, _ = _started_profiler(monkeypatch)
+    for duration in [0.0005, 0.0015, 0.003, 0.004, 0.04, 7.0]:
+        profile.record_command('xdotool', duration)
+    profile.count('clicks', 3)
+    profile.count('clicks')
+
+    report = profile.report()
+    summary = report['commands']['xdotool']
+    assert summary['histogram'] == {'<=1ms': 1, '<=2ms': 1, '<=5ms': 2, '<=50ms': 1, '>5000ms': 1}
+    assert (summary['count'], summary['min_ms'], summary['p50_ms'], summary['max_ms']) == (6, 0.5, 4.0, 7000.0)
+    assert report['counters'] == {'clicks': 4}
+
+
+def test_collapsed_stacks_hold_the_self_time_of_every_span(monkeypatch, tmp_path, capsys):
+    profile, clock = _started_profiler(monkeypatch)
+    with profile.span('apply'):
+        # Spans without any time of their own are left out
+        with profile.span('pan'):
+            clock.now += 0.25
+        with profile.span('execute'):
+            clock.now += 0.5
+            profile.record_command('xdotool', 0.125)
+    prefix = str(tmp_path / 'profile')
+    profile.write(prefix)
+
+    with open(prefix + '.collapsed') as f:
+        assert f.read().splitlines() == ['apply;execute 375000', 'apply;execute;xdotool 125000', 'apply;pan 250000']
+    assert "  apply: 0.75s in 1 calls" in capsys.readouterr().out
@@ -0,0 +1,44 @@
+import random
+
+from puzzle import Puzzle
+from solver.logic import LogicSolver
+from solver.propagation import propagate_bulk
+from topology import get_topology
+from util import rotate_configuration
+
+
+def _scrambled_puzzle(topology, seed):
+    rng = random.Random(seed)
+    solution = topology.random_tree(rng)
+    configurations = [rotate_configuration(configuration, rng.randrange(count), count)
+                      for configuration, count in zip(solution, topology.side_counts)]
+    return Puzzle.from_topology(topology, configurations), solution
+
+
+def test_bulk_propagation_keeps_the_solution_on_every_puzzle_of_a_topology():
+    # The index arrays are built for the first puzzle and reused for the second one
+    topology = get_topology('hexagonal', 40, 30)
+    for seed in range(2):
+        puzzle, solution = _scrambled_puzzle(topology, seed)
+        resolved = propagate_bulk(puzzle)
+
+        assert resolved
+        assert all(configuration in tile.possible_configurations
+                   for tile, configuration in zip(puzzle.tiles, solution))
+        assert all(len(tile.possible_configurations) == 1 for tile in resolved)
+
+        fresh, _ = _scrambled_puzzle(topology, seed)
+        assert [tile.index for tile in propagate_bulk(fresh)] == [tile.index for tile in resolved]
+
+
+def test_logic_solver_sweeps_until_the_tiles_resolved_in_bulk_allow_no_more():
+    # A single sweep after the bulk pass leaves tiles on this board that a further sweep resolves
+    puzzle, solution = _scrambled_puzzle(get_topology('hexagonal', 40, 30), 17)
+    solver = LogicSolver(puzzle)
+    solver.solve()
+    domains = [set(tile.possible_configurations) for tile in puzzle.tiles]
+
+    for tile in sorted(puzzle.tiles, key=lambda t: (t.y, t.x)):
+        solver._solve_one(tile)
+    assert [tile.possible_configurations for tile in puzzle.tiles] == domains
+    assert all(configuration in domain for domain, configuration in zip(domains, solution))
@@ -0,0 +1,49 @@
+import pytest
+
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+
+
+@pytest.mark.parametrize('streaming_read', [False, True])
+def test_read_a_board_whose_last_frame_moves_more_than_half_the_view(streaming_read):
+    # The last vertical frame of this board is scrolled by more than half the height of the view
+    puzzle = SyntheticPuzzle.generate(40, 30, 0)[0]
+    ui = SyntheticUI(puzzle)
+    manager = PuzzleManager(ui.window_name, 'hexagonal', streaming_read, ui=ui)
+    manager.read_puzzle()
+
+    assert manager.bridge.puzzle_size == (40, 30)
+    assert [tile.initial_configuration for tile in manager.puzzle.tiles] == puzzle.configurations
+
+
+@pytest.mark.parametrize('streaming_read', [False, True])
+def test_read_a_board_whose_view_lags_behind_the_mouse(streaming_read):
+    # Scans have to drag further than the frames they want to move by
+    puzzle = SyntheticPuzzle.generate(40, 30, 0)[0]
+    ui = SyntheticUI(puzzle)
+    ui.drag_ratio = 0.8
+    manager = PuzzleManager(ui.window_name, 'hexagonal', streaming_read, verify_pans=True, ui=ui)
+    manager.read_puzzle()
+
+    assert manager.bridge.puzzle_size == (40, 30)
+    assert [tile.initial_configuration for tile in manager.puzzle.tiles] == puzzle.configurations
+
+
+def test_stitched_scan_only_drags_while_the_border_is_out_of_view():
+    puzzle = SyntheticPuzzle.generate(40, 30, 0)[0]
+    ui = SyntheticUI(puzzle)
+    drag = ui.mouse_drag_path
+    idle_drags = []
+
+    def _recording_drag(*args, **kwargs):
+        pan = tuple(ui.pan)
+        drag(*args, **kwargs)
+        if tuple(ui.pan) == pan:
+            idle_drags.append(pan)
+
+    ui.mouse_drag_path = _recording_drag
+    manager = PuzzleManager(ui.window_name, 'hexagonal', ui=ui)
+    manager.read_puzzle()
+
+    assert [tile.initial_configuration for tile in manager.puzzle.tiles] == puzzle.configurations
+    assert idle_drags == []
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from topology import BUILDERS, get_topology
+
+KINDS = sorted(BUILDERS)
+# Wrapping hexagonal and cube grids need an even height, etrar grids a height divisible by 4
+SIZES = [(1, 4), (4, 4), (5, 8), (6, 12)]
+
+
+@pytest.mark.parametrize('kind', KINDS)
+@pytest.mark.parametrize('width, height', SIZES + [(3, 5), (7, 3)])
+def test_neighbors_point_back(kind, width, height):
+    topology = get_topology(kind, width, height)
+    for index in range(topology.tile_count()):
+        for side in range(topology.side_counts[index]):
+            neighbor = topology.neighbor(index, side)
+            if neighbor < 0:
+                continue
+            reverse = topology.reverse_side(index, side)
+            assert neighbor != index
+            assert 0 <= reverse < topology.side_counts[neighbor]
+            assert (topology.neighbor(neighbor, reverse), topology.reverse_side(neighbor, reverse)) == (index, side)
+
+
+@pytest.mark.parametrize('kind', KINDS)
+@pytest.mark.parametrize('width, height', SIZES)
+def test_wrapped_neighbors_point_back_and_leave_no_border(kind, width, height):
+    topology = get_topology(kind, width, height, wrap=True)
+    assert topology.tile_count() == get_topology(kind, width, height).tile_count()
+    for index in range(topology.tile_count()):
+        for side in range(topology.side_counts[index]):
+            neighbor = topology.neighbor(index, side)
+            reverse = topology.reverse_side(index, side)
+            assert neighbor >= 0
+            assert (topology.neighbor(neighbor, reverse), topology.reverse_side(neighbor, reverse)) == (index, side)
+
+
+@pytest.mark.parametrize('kind', KINDS)
+@pytest.mark.parametrize('wrap', [False, True])
+def test_random_trees_are_solutions(kind, wrap):
+    topology = get_topology(kind, 4, 4, wrap)
+    solution = topology.random_tree(random.Random(0))
+
+    assert topology.is_solution(solution)
+    connections = sum(bin(configuration).count('1') for configuration in solution)
+    assert connections == 2 * (topology.tile_count() - 1)
+
+
+@pytest.mark.parametrize('kind, height', [('hexagonal', 3), ('cube', 3), ('etrar', 6)])
+def test_wrapping_grids_reject_heights_that_do_not_tile(kind, height):
+    with pytest.raises(Exception):
+        get_topology(kind, 4, height, wrap=True)
@@ -0,0 +1,60 @@
+import ui
+from ui import UI, SettleStats
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _patched_ui(monkeypatch, checksums):
+    clock = _Clock()
+    monkeypatch.setattr(ui.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(ui.time, 'sleep', clock.sleep)
+    window = UI('test')
+    captures = iter(checksums)
+    monkeypatch.setattr(window, 'capture_checksum', lambda region=None: next(captures))
+    return window, clock
+
+
+def test_settle_stats_keep_a_running_summary():
+    stats = SettleStats()
+    assert str(stats) == "0 waits, 0.00s in total, mean 0ms, max 0ms"
+    for settle_time in [0.1, 0.3, 0.2]:
+        stats.add(settle_time)
+
+    assert (stats.count, round(stats.total, 6), stats.maximum) == (3, 0.6, 0.3)
+    assert str(stats) == "3 waits, 0.60s in total, mean 200ms, max 300ms"
+
+
+def test_wait_until_stable_stops_on_two_equal_captures(monkeypatch):
+    window, clock = _patched_ui(monkeypatch, [1, 2, 3, 3, 4])
+
+    settle_time = window.wait_until_stable()
+    assert settle_time == clock.now == 3 * ui.STABLE_POLL_INTERVAL
+    assert window.settle_stats.count == 1
+
+
+def test_wait_until_stable_gives_up_after_the_timeout(monkeypatch):
+    window, clock = _patched_ui(monkeypatch, range(1000))
+
+    settle_time = window.wait_until_stable(timeout=0.1)
+    assert 0.1 < settle_time <= 0.1 + ui.STABLE_POLL_INTERVAL
+    assert window.settle_stats.maximum == settle_time
+
+
+def test_drag_path_is_a_single_command_followed_by_a_single_wait(monkeypatch):
+    window, _ = _patched_ui(monkeypatch, [1, 1])
+    commands = []
+    monkeypatch.setattr(window, '_run', lambda command, **kwargs: commands.append(command))
+
+    window.mouse_drag_path(10, 20, [(5, 0), (5, 5), (0, -10)])
+    assert commands == [['xdotool', 'mousemove', '10', '20', 'mousedown', '1', 'mousemove', '15', '20',
+                         'mousemove', '20', '25', 'mousemove', '20', '15', 'mouseup', '1']]
+    assert window.settle_stats.count == 1
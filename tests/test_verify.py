@@ -0,0 +1,52 @@
+from manager import PuzzleManager
+from synthetic_ui import SyntheticUI, SyntheticPuzzle
+from uibridge.hexagonal import NEIGHBORS, VERIFY_MAX_ROUNDS
+from util import rotate_configuration
+
+
+def _solved_manager(width, height, seed):
+    ui = SyntheticUI(SyntheticPuzzle.generate(width, height, seed)[0])
+    manager = PuzzleManager(ui.window_name, 'hexagonal', ui=ui)
+    manager.read_puzzle()
+    manager.solve_puzzle('bt')
+    return ui, manager
+
+
+def test_verification_repairs_missed_clicks_in_every_window():
+    ui, manager = _solved_manager(40, 30, 0)
+    ui.miss_rate = 0.1
+
+    manager.apply_puzzle(False, verify=True)
+    assert ui.missed_clicks > 0
+    assert ui.puzzle.is_solved()
+
+
+def test_verification_unlocks_tiles_locked_in_the_wrong_rotation(capsys):
+    ui, manager = _solved_manager(12, 10, 0)
+    bridge = manager.bridge
+    plan = bridge.plan_apply(manager.puzzle, False)
+    manager.apply_puzzle(False)
+    # The rotation of the tile got lost but the lock click landed
+    action = plan.windows[0].actions[0]
+    index = next(tile.index for tile in manager.puzzle.tiles if (tile.x, tile.y) == (action.x, action.y))
+    ui.puzzle.configurations[index] = rotate_configuration(ui.puzzle.configurations[index], 1, NEIGHBORS)
+    assert index in ui.puzzle.locked
+    capsys.readouterr()
+
+    bridge._verify_apply(manager.puzzle, plan)
+    assert ui.puzzle.is_solved()
+    assert index in ui.puzzle.locked
+    assert capsys.readouterr().out.splitlines()[-2:] == \
+           ["Verification round 1: 1 tiles to repair", "Verification round 2: 0 tiles to repair"]
+
+
+def test_verification_gives_up_after_the_last_round(capsys):
+    ui, manager = _solved_manager(12, 10, 0)
+    ui.miss_rate = 1.0
+    capsys.readouterr()
+
+    manager.apply_puzzle(False, verify=True)
+    output = capsys.readouterr().out.splitlines()
+    assert not ui.puzzle.is_solved()
+    assert sum(line.startswith("Verification round") for line in output) == VERIFY_MAX_ROUNDS + 1
+    assert output[-1] == "Giving up on repairing tiles."